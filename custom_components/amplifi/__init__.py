@@ -1,24 +1,74 @@
 """The Amplifi integration."""
+import asyncio
 import logging
 
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, callback
-from homeassistant.const import CONF_HOST, CONF_PASSWORD
+import voluptuous as vol
 
-from .const import DOMAIN, COORDINATOR, ENTITIES
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import entity_registry as er
+
+from .const import (
+    DOMAIN,
+    ATTR_ENTRY_ID,
+    ATTR_PRESENCE_ONLY,
+    COORDINATOR,
+    ENTITIES,
+    SCHEDULER,
+    SERVICE_REFRESH,
+    VALIDATED_SESSIONS,
+)
 from .coordinator import AmplifiDataUpdateCoordinator
+from .scheduler import AmplifiScheduler
 
 _LOGGER = logging.getLogger(__name__)
 
 # Amplifi integration is setup as a sensor integration
 PLATFORMS = ["sensor", "device_tracker"]
 
+# Unique ids that were shared by every entry before they were scoped to it
+LEGACY_UNIQUE_ID_PREFIXES = (f"{DOMAIN}_wan_", f"{DOMAIN}_eth_port_")
+
+REFRESH_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_PRESENCE_ONLY, default=False): cv.boolean,
+    }
+)
+
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the Amplify component."""
 
     # Set the amplifi namespace
     hass.data.setdefault(DOMAIN, {})
+    # Polls of every router are staggered and limited by a shared scheduler
+    hass.data[DOMAIN][SCHEDULER] = AmplifiScheduler(hass)
+
+    async def async_refresh(call: ServiceCall) -> None:
+        """Poll one router, or every router, now."""
+        entry_id = call.data.get(ATTR_ENTRY_ID)
+        coordinators = [
+            hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+            for entry in hass.config_entries.async_entries(DOMAIN)
+            if entry.entry_id in hass.data[DOMAIN]
+            and entry_id in (None, entry.entry_id)
+        ]
+        if entry_id is not None and not coordinators:
+            raise ServiceValidationError(f"No loaded Amplifi entry {entry_id}")
+        await asyncio.gather(
+            *(
+                coordinator.async_request_poll(call.data[ATTR_PRESENCE_ONLY])
+                for coordinator in coordinators
+            )
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_REFRESH, async_refresh, schema=REFRESH_SCHEMA
+    )
 
     return True
 
@@ -26,30 +76,62 @@ async def async_setup(hass: HomeAssistant, config: dict):
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Amplify from a config entry."""
 
-    coordinator = AmplifiDataUpdateCoordinator(
-        hass, entry.data[CONF_HOST], entry.data[CONF_PASSWORD]
-    )
-    await coordinator.async_config_entry_first_refresh()
+    await _async_migrate_unique_ids(hass, entry)
+
+    coordinator = AmplifiDataUpdateCoordinator(hass, entry)
+
+    # Create the entities from the cache and reconcile them in the background
+    restored = await coordinator.async_restore()
+    # A new entry polls with the session the config flow just logged in with
+    validated_sessions = hass.data[DOMAIN].get(VALIDATED_SESSIONS, {})
+    session = validated_sessions.pop(entry.data[CONF_HOST], None)
+    if session is not None:
+        coordinator.async_adopt_session(session)
+    if not restored:
+        await coordinator.async_config_entry_first_refresh()
 
-    hass.data[DOMAIN][entry.entry_id] = {COORDINATOR: coordinator, ENTITIES: {}}
+    hass.data[DOMAIN][entry.entry_id] = {COORDINATOR: coordinator, ENTITIES: set()}
 
     # Setup the platforms for the amplifi integration
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
-    @callback
-    def async_stop_coordinator():
-        coordinator._async_stop_refresh(None)
+    if restored:
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN} first refresh"
+        )
 
-    entry.async_on_unload(async_stop_coordinator)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     return True
 
 
+async def _async_migrate_unique_ids(hass: HomeAssistant, entry: ConfigEntry):
+    """Scope the WAN and ethernet port unique ids of an entry to the entry."""
+
+    @callback
+    def migrate(entity_entry: er.RegistryEntry):
+        if not entity_entry.unique_id.startswith(LEGACY_UNIQUE_ID_PREFIXES):
+            return None
+        unique_id = entity_entry.unique_id.replace(
+            f"{DOMAIN}_", f"{DOMAIN}_{entry.entry_id}_", 1
+        )
+        _LOGGER.debug("Migrating unique id %s to %s", entity_entry.unique_id, unique_id)
+        return {"new_unique_id": unique_id}
+
+    await er.async_migrate_entries(hass, entry.entry_id, migrate)
+
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options changed."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
-    # coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+    coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
 
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
+        await coordinator.async_save()
         hass.data[DOMAIN].pop(entry.entry_id)
     return unload_ok
@@ -0,0 +1,69 @@
+"""Circuit breaker keeping polls away from a router that is down."""
+from .const import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN
+
+
+class CircuitBreaker:
+    """Stop polling a router after repeated failures.
+
+    The breaker opens after threshold consecutive failed polls. While it is
+    open polls fail at once without a request; once reset_timeout seconds
+    have passed the next poll only probes the login page (half open). A
+    successful probe closes the breaker, a failed one opens it again with the
+    timeout doubled up to max_reset_timeout.
+    """
+
+    def __init__(self, threshold, reset_timeout, max_reset_timeout):
+        """Initialize a closed breaker, times are in monotonic seconds."""
+        self.threshold = threshold
+        self._base_reset_timeout = reset_timeout
+        self._max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        # Consecutive failed polls and probes
+        self.failures = 0
+        self.probes = 0
+        self.retry_at = None
+
+    def probe_due(self, now):
+        """Return True when an open breaker should probe the router."""
+        return self.state == BREAKER_OPEN and now >= self.retry_at
+
+    def start_probe(self):
+        """Let the next request through as a probe."""
+        self.state = BREAKER_HALF_OPEN
+        self.probes += 1
+
+    def success(self):
+        """Close the breaker, return True if it was not closed."""
+        changed = self.state != BREAKER_CLOSED
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.reset_timeout = self._base_reset_timeout
+        self.retry_at = None
+        return changed
+
+    def failure(self, now):
+        """Record a failed poll or probe, return True if the state changed."""
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN:
+            self.reset_timeout = min(self.reset_timeout * 2, self._max_reset_timeout)
+        elif self.state == BREAKER_CLOSED and self.failures < self.threshold:
+            return False
+
+        self.state = BREAKER_OPEN
+        self.retry_at = now + self.reset_timeout
+        return True
+
+    def as_dict(self, now):
+        """Return a JSON serialisable representation of the breaker."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "probes": self.probes,
+            "reset_timeout": self.reset_timeout,
+            "retry_in": (
+                round(max(self.retry_at - now, 0), 1)
+                if self.state == BREAKER_OPEN
+                else None
+            ),
+        }
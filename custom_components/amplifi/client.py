@@ -1,9 +1,34 @@
+import asyncio
 import re
 import logging
 import json
+import time
+
+from contextlib import asynccontextmanager
+
+from aiohttp import ClientError, ClientTimeout, ServerTimeoutError
+from async_timeout import timeout
+from yarl import URL
+
+from .stats import STAGE_DECODE, STAGE_LOGIN, STAGE_REQUEST
 
 _LOGGER = logging.getLogger(__name__)
 
+SESSION_COOKIE = "webui-session"
+# Responses the router sends instead of data once our session is invalidated
+SESSION_EXPIRED_STATUSES = (401, 403)
+
+# Default seconds allowed to open a connection, for the whole login and for
+# one info-async.php request
+CONNECT_TIMEOUT = 5
+LOGIN_TIMEOUT = 10
+DATA_TIMEOUT = 10
+# Steps of async_validate(), each has its own timeout
+VALIDATION_STEPS = ("login_page", "login", "info_page", "data")
+
+LOGIN_TOKEN_RE = re.compile(r"value=\'([A-Za-z0-9]{16})\'")
+INFO_TOKEN_RE = re.compile(r"token=\'([A-Za-z0-9]{16})\'")
+
 
 class AmplifiClientError(Exception):
     """Generic error of Amplifi client."""
@@ -11,31 +36,109 @@ class AmplifiClientError(Exception):
     pass
 
 
+class AmplifiSessionExpired(AmplifiClientError):
+    """The router no longer accepts the session, e.g. after a web UI login."""
+
+    def __init__(self, message, login_token=None):
+        """Initialise with the login token found on the response, if any."""
+        super().__init__(message)
+        self.login_token = login_token
+
+
+class AmplifiAuthError(AmplifiClientError):
+    """The router did not accept the password."""
+
+    pass
+
+
+class AmplifiTimeoutError(AmplifiClientError):
+    """The router did not answer within the timeout of a stage."""
+
+    def __init__(self, message, stage):
+        """Initialise with the stage that timed out: connect, login or data."""
+        super().__init__(message)
+        self.stage = stage
+
+
+class AmplifiValidationError(AmplifiClientError):
+    """A step of the connection test failed."""
+
+    def __init__(self, message, step, timings):
+        """Initialise with the failed step and the seconds each step took."""
+        super().__init__(message)
+        self.step = step
+        self.timings = timings
+
+
 class AmplifiClient:
-    def __init__(self, client, host: str, password: str):
-        """Initialise the Amplifi client."""
+    def __init__(
+        self,
+        client,
+        host: str,
+        password: str,
+        stats=None,
+        recorder=None,
+        connect_timeout=CONNECT_TIMEOUT,
+        login_timeout=LOGIN_TIMEOUT,
+        data_timeout=DATA_TIMEOUT,
+    ):
+        """Initialise the Amplifi client.
+
+        stats is an optional PollStats and recorder an optional
+        PayloadRecorder that every info-async.php response is appended to.
+        The timeouts are in seconds, a connection that cannot be opened in
+        connect_timeout fails the stage it was opened for.
+        """
         self._client = client
         self._host = host
         self._password = password
+        self._stats = stats
+        self._recorder = recorder
+        self._request_timeout = ClientTimeout(total=None, connect=connect_timeout)
+        self._login_timeout = login_timeout
+        self._data_timeout = data_timeout
         self._base_url = f"http://{self._host}"
         self._login_token = None
         self._info_token = None
+        self.counters = {"login": 0, "reauth": 0}
+
+    async def async_get_devices(self, mode="full", decode=True):
+        """Get the device list from the router, mode is the info-async.php "do" value
 
-    async def async_get_devices(self):
-        """Get the default device list from the router"""
-        return await self._async_get_info()
+        With decode=False the raw response body is returned so that it can be
+        decoded with decode_devices() off the event loop.
+        """
+        body = await self._async_get_info(mode)
+        return self.decode_devices(body) if decode else body
+
+    def decode_devices(self, body):
+        """Decode a response body of info-async.php, safe to run in a thread."""
+        start = time.perf_counter()
+        try:
+            devices = json.loads(body)
+
+            # _LOGGER.debug(json.dumps(devices))
+            return devices
+        except ValueError as error:
+            # The session is still valid, only this response was broken
+            _LOGGER.error("[GET] '%s' - failed" % (self._base_url + "/info-async.php"))
+            _LOGGER.error(error)
+            raise AmplifiClientError("Failed to get devices from router.") from error
+        finally:
+            if self._stats is not None:
+                self._stats.add_time(STAGE_DECODE, time.perf_counter() - start)
 
     async def _async_get_login_token(self):
         """Get the login token from the form."""
         _LOGGER.debug("[GET] '%s' - get login token" % (self._base_url + "/info.php"))
-        resp = await self._client.get(self._base_url + "/login.php")
+        resp = await self._client.get(
+            self._base_url + "/login.php", timeout=self._request_timeout
+        )
         if resp.status != 200:
             raise AmplifiClientError("Expected a response code of 200.")
 
         login_page_content = await resp.text()
-        token_search_result = re.findall(
-            r"value=\'([A-Za-z0-9]{16})\'", login_page_content
-        )
+        token_search_result = LOGIN_TOKEN_RE.findall(login_page_content)
 
         if not token_search_result:
             self._login_token = None
@@ -49,18 +152,28 @@ class AmplifiClient:
         """Login and setup a cookie based session with the router"""
         _LOGGER.debug("[POST] '%s' - logging in" % (self._base_url + "/login.php"))
         form_data = {"token": self._login_token, "password": self._password}
-        resp = await self._client.post(self._base_url + "/login.php", data=form_data)
+        resp = await self._client.post(
+            self._base_url + "/login.php",
+            data=form_data,
+            timeout=self._request_timeout,
+        )
         if resp.status != 200:
             raise AmplifiClientError("Expected a response code of 200.")
-        if "webui-session" not in resp.cookies:
-            raise AmplifiClientError("Authentication failure.")
+        if not any(SESSION_COOKIE in r.cookies for r in (*resp.history, resp)):
+            raise AmplifiAuthError("Authentication failure.")
+
+        # Some firmwares land on the info page after login which saves a request
+        search_result = INFO_TOKEN_RE.findall(await resp.text())
+        return search_result[0] if search_result else None
 
     async def _async_get_info_token(self):
         """Get the info token after logging in"""
         _LOGGER.debug("[GET] '%s' - get info token" % (self._base_url + "/info.php"))
-        resp = await self._client.get(self._base_url + "/info.php")
+        resp = await self._client.get(
+            self._base_url + "/info.php", timeout=self._request_timeout
+        )
         info_page_content = await resp.text()
-        search_result = re.findall(r"token=\'([A-Za-z0-9]{16})\'", info_page_content)
+        search_result = INFO_TOKEN_RE.findall(info_page_content)
 
         if resp.status != 200:
             self._info_token = None
@@ -73,51 +186,205 @@ class AmplifiClient:
         _LOGGER.debug("Using token=%s as info token" % (info_token))
         return info_token
 
-    async def _async_get_info(self):
-        info_async_url = self._base_url + "/info-async.php"
-        _LOGGER.debug("[GET] '%s' - get info" % (info_async_url))
+    async def _async_get_info(self, mode):
         await self._async_init_client()
-        form_data = {"do": "full", "token": self._info_token}
-        resp = await self._client.post(info_async_url, data=form_data)
+        try:
+            return await self._async_request_info(mode)
+        except AmplifiSessionExpired as expired:
+            if mode != "full":
+                # Firmwares without the light mode may answer it with a page
+                # too, only a full request tells that the session expired
+                raise AmplifiClientError(
+                    f"Request '{mode}' was refused: {expired}"
+                ) from expired
+            # Log in again and retry within the same update
+            _LOGGER.debug("Session was invalidated by the router, logging in again")
+            self.counters["reauth"] += 1
+            await self._async_init_client(force=True, login_token=expired.login_token)
 
-        if resp.status != 200:
-            raise AmplifiClientError("Expected a response code of 200.")
+        try:
+            return await self._async_request_info(mode)
+        except AmplifiSessionExpired as error:
+            self._handle_client_failure()
+            raise AmplifiClientError("Session rejected right after login.") from error
+
+    async def _async_request_info(self, mode):
+        info_async_url = self._base_url + "/info-async.php"
+        _LOGGER.debug("[GET] '%s' - get info (%s)" % (info_async_url, mode))
+        form_data = {"do": mode, "token": self._info_token}
+        start = time.perf_counter()
+        async with self._stage("data", self._data_timeout):
+            resp = await self._client.post(
+                info_async_url, data=form_data, timeout=self._request_timeout
+            )
+
+            if resp.status in SESSION_EXPIRED_STATUSES:
+                raise AmplifiSessionExpired(f"Response code {resp.status}.")
+            if resp.status != 200:
+                raise AmplifiClientError("Expected a response code of 200.")
+
+            body = await resp.read()
+        elapsed = time.perf_counter() - start
+        if self._stats is not None:
+            self._stats.add_time(STAGE_REQUEST, elapsed)
+            self._stats.add_bytes(len(body))
+        if resp.history or body.lstrip()[:1] == b"<":
+            # Redirected to, or served, the login page instead of JSON
+            token_search_result = LOGIN_TOKEN_RE.findall(
+                body.decode(errors="replace")
+            )
+            raise AmplifiSessionExpired(
+                "Received a page instead of JSON.",
+                token_search_result[0] if token_search_result else None,
+            )
 
+        if self._recorder is not None:
+            await self._async_record(mode, body, elapsed)
+        return body
+
+    async def _async_record(self, mode, body, elapsed):
+        """Append a response to the recording, a failure only stops recording."""
         try:
-            devices = await resp.json()
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._recorder.record, mode, body, elapsed
+            )
+        except OSError as error:
+            _LOGGER.warning("Recording to %s failed: %s", self._recorder.path, error)
+            self._recorder = None
 
-            # _LOGGER.debug(json.dumps(devices))
-            return devices
-        except (Exception) as error:
-            _LOGGER.error("[GET] '%s' - failed" % (info_async_url))
-            _LOGGER.error(error)
-            self._handle_client_failure()
-            raise AmplifiClientError("Failed to get devices from router.")
+    @asynccontextmanager
+    async def _stage(self, stage, seconds):
+        """Fail with an AmplifiTimeoutError when a stage takes too long."""
+        try:
+            async with timeout(seconds):
+                yield
+        except asyncio.TimeoutError as error:
+            if isinstance(error, ServerTimeoutError):
+                stage = "connect"
+            raise AmplifiTimeoutError(
+                f"Timed out in the {stage} stage.", stage
+            ) from error
 
     def _handle_client_failure(self):
         self._client.cookie_jar.clear()
         self._login_token = self._info_token = None
 
-    async def _async_init_client(self, force=False):
+    async def _async_init_client(self, force=False, login_token=None):
+        """Log in unless a session is already established.
+
+        A login token found on the page that reported the expired session is
+        reused so that re-authentication only needs the login POST.
+        """
         if force == True or self._login_token is None or self._info_token is None:
+            start = time.perf_counter()
             try:
-                if force == True:
-                    self._client.cookie_jar.clear()
-                self._login_token = await self._async_get_login_token()
-                await self._async_login()
-                self._info_token = await self._async_get_info_token()
-            except:
+                async with self._stage("login", self._login_timeout):
+                    if force == True and login_token is None:
+                        self._client.cookie_jar.clear()
+                    self._login_token = (
+                        login_token or await self._async_get_login_token()
+                    )
+                    self._info_token = (
+                        await self._async_login() or await self._async_get_info_token()
+                    )
+                self.counters["login"] += 1
+            except (ClientError, asyncio.TimeoutError, ValueError) as error:
+                self._login_token = self._info_token = None
+                raise AmplifiClientError(
+                    "Failed to init amplifi client session."
+                ) from error
+            except BaseException:
+                # Auth and stage timeout errors, and cancellation, propagate
+                # unchanged but must not leave half a session behind
                 self._login_token = self._info_token = None
-                raise AmplifiClientError("Failed to init amplifi client session.")
+                raise
+            finally:
+                if self._stats is not None:
+                    self._stats.add_time(STAGE_LOGIN, time.perf_counter() - start)
 
-    async def async_test_connection(self):
-        """Return true when the correct host and password is provided"""
+    async def async_validate(self):
+        """Log in and fetch the data step by step.
+
+        Return the seconds each step of VALIDATION_STEPS took, info_page is
+        left out when the login already landed on it. Raise an
+        AmplifiValidationError naming the step that failed otherwise. The
+        session stays logged in and can be exported.
+        """
+        timings = {}
+
+        async def run_step(step, seconds, step_method, *args):
+            start = time.perf_counter()
+            try:
+                async with self._stage(step, seconds):
+                    return await step_method(*args)
+            except (AmplifiClientError, ClientError, asyncio.TimeoutError) as error:
+                raise AmplifiValidationError(
+                    str(error) or type(error).__name__, step, timings
+                ) from error
+            finally:
+                timings[step] = time.perf_counter() - start
+
+        self._handle_client_failure()
+        login_token = await run_step(
+            "login_page", self._login_timeout, self._async_get_login_token
+        )
+        self._login_token = login_token
+        info_token = await run_step("login", self._login_timeout, self._async_login)
+        if info_token is None:
+            info_token = await run_step(
+                "info_page", self._login_timeout, self._async_get_info_token
+            )
+        self._login_token, self._info_token = login_token, info_token
+        self.counters["login"] += 1
+
+        body = await run_step(
+            "data", self._data_timeout, self._async_request_info, "full"
+        )
+        try:
+            devices = self.decode_devices(body)
+        except AmplifiClientError as error:
+            raise AmplifiValidationError(str(error), "data", timings) from error
+        if not isinstance(devices, list) or not devices or not devices[0]:
+            raise AmplifiValidationError("Response has no topology.", "data", timings)
+        return timings
+
+    async def async_probe(self):
+        """Check that the router answers by fetching the login page only.
+
+        The session is left untouched, raise an AmplifiClientError when the
+        router does not answer.
+        """
         try:
-            await self._async_init_client(force=True)
-            return True
-        except (Exception):
+            async with self._stage("login", self._login_timeout):
+                await self._async_get_login_token()
+        except ClientError as error:
+            raise AmplifiClientError(str(error) or type(error).__name__) from error
+
+    def export_session(self):
+        """Return the session state needed to resume without logging in."""
+        if self._login_token is None or self._info_token is None:
+            return None
+
+        cookies = self._client.cookie_jar.filter_cookies(URL(self._base_url))
+        if SESSION_COOKIE not in cookies:
             return None
 
+        return {
+            "login_token": self._login_token,
+            "info_token": self._info_token,
+            "cookie": cookies[SESSION_COOKIE].value,
+        }
+
+    def restore_session(self, session):
+        """Resume a session previously returned by export_session."""
+        if not session:
+            return
+        self._client.cookie_jar.update_cookies(
+            {SESSION_COOKIE: session["cookie"]}, URL(self._base_url)
+        )
+        self._login_token = session["login_token"]
+        self._info_token = session["info_token"]
+
     def get_router_mac_addr(self, devices):
         for device in devices[0]:
             if devices[0][device]["role"] == "Router":
@@ -5,11 +5,41 @@ import aiohttp
 import voluptuous as vol
 
 from homeassistant import config_entries, core, exceptions
+from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.aiohttp_client import async_create_clientsession
-from homeassistant.const import CONF_HOST, CONF_PASSWORD
-
-from .client import AmplifiClient
-from .const import DOMAIN, CONF_ENABLE_NEW_DEVICES
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_SCAN_INTERVAL
+
+from .client import AmplifiAuthError, AmplifiClient, AmplifiValidationError
+from .const import (
+    DOMAIN,
+    VALIDATED_SESSIONS,
+    CONF_ADAPTIVE_POLLING,
+    CONF_CLIENT_RATE_SENSORS,
+    CONF_CONSIDER_HOME,
+    CONF_ENABLE_NEW_DEVICES,
+    CONF_EXCLUDED_ATTRIBUTES,
+    CONF_FULL_ATTRIBUTES,
+    CONF_INVENTORY_SCAN_INTERVAL,
+    CONF_MIN_ONLINE,
+    CONF_OFFLOAD_THRESHOLD,
+    CONF_RECORD_HASH_IDENTIFIERS,
+    CONF_RECORD_PAYLOADS,
+    CONF_WAN_SCAN_INTERVAL,
+    CONF_WAN_STATISTICS_WINDOWS,
+    CONSIDER_HOME,
+    DEFAULT_EXCLUDED_ATTRIBUTES,
+    HIGH_CHURN_ATTRIBUTES,
+    INVENTORY_SCAN_INTERVAL,
+    MAX_SCAN_INTERVAL,
+    MIN_ONLINE,
+    MIN_SCAN_INTERVAL,
+    OFFLOAD_THRESHOLD,
+    SCAN_INTERVAL,
+    WAN_SCAN_INTERVAL,
+    WAN_STATISTICS_WINDOW_OPTIONS,
+    WAN_STATISTICS_WINDOWS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,11 +62,31 @@ async def validate_input(hass: core.HomeAssistant, data: dict):
     session = async_create_clientsession(hass, False, True, cookie_jar=jar)
     client = AmplifiClient(session, data[CONF_HOST], data[CONF_PASSWORD])
 
-    result = await client.async_test_connection()
-    if not result:
-        raise CannotConnect
+    try:
+        timings = await client.async_validate()
+    except AmplifiValidationError as error:
+        _LOGGER.debug(
+            "Validating %s failed at %s: %s (%s)",
+            data[CONF_HOST],
+            error.step,
+            error,
+            format_timings(error.timings),
+        )
+        if isinstance(error.__cause__, AmplifiAuthError):
+            raise InvalidAuth from error
+        raise ValidationStepFailed(error.step, str(error), error.timings) from error
+
+    _LOGGER.debug("Validated %s (%s)", data[CONF_HOST], format_timings(timings))
+    return {
+        "title": data[CONF_HOST],
+        "session": client.export_session(),
+        "timings": timings,
+    }
+
 
-    return {"title": data[CONF_HOST]}
+def format_timings(timings):
+    """Return the step timings of a validation as text."""
+    return ", ".join(f"{step} {seconds:.2f} s" for step, seconds in timings.items())
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -49,13 +99,26 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Handle the initial step."""
 
         errors = {}
+        placeholders = None
         if user_input is not None:
             try:
                 info = await validate_input(self.hass, user_input)
 
+                if info["session"] is not None:
+                    # Saves logging in again for the first poll of the entry
+                    self.hass.data.setdefault(DOMAIN, {}).setdefault(
+                        VALIDATED_SESSIONS, {}
+                    )[user_input[CONF_HOST]] = info["session"]
                 return self.async_create_entry(title=info["title"], data=user_input)
-            except CannotConnect:
-                errors["base"] = "cannot_connect"
+            except InvalidAuth:
+                errors["base"] = "invalid_auth"
+            except ValidationStepFailed as error:
+                errors["base"] = "step_failed"
+                placeholders = {
+                    "step": error.step,
+                    "error": error.error,
+                    "timings": format_timings(error.timings) or "-",
+                }
             except InvalidHost:
                 errors["host"] = "cannot_connect"
             except Exception:  # pylint: disable=broad-except
@@ -64,13 +127,119 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         # If there is no user input or there were errors, show the form again, including any errors that were found with the input.
         return self.async_show_form(
-            step_id="user", data_schema=DATA_SCHEMA, errors=errors
+            step_id="user",
+            data_schema=DATA_SCHEMA,
+            errors=errors,
+            description_placeholders=placeholders,
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
 
-class CannotConnect(exceptions.HomeAssistantError):
-    """Error to indicate we cannot connect."""
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the polling options of Amplifi."""
+
+    def __init__(self, config_entry):
+        """Initialize options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        options_schema = vol.Schema(
+            {
+                vol.Required(
+                    CONF_SCAN_INTERVAL,
+                    default=options.get(CONF_SCAN_INTERVAL, SCAN_INTERVAL),
+                ): vol.All(
+                    vol.Coerce(int),
+                    vol.Range(min=MIN_SCAN_INTERVAL, max=MAX_SCAN_INTERVAL),
+                ),
+                vol.Required(
+                    CONF_ADAPTIVE_POLLING,
+                    default=options.get(CONF_ADAPTIVE_POLLING, False),
+                ): bool,
+                vol.Required(
+                    CONF_WAN_SCAN_INTERVAL,
+                    default=options.get(CONF_WAN_SCAN_INTERVAL, WAN_SCAN_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=MAX_SCAN_INTERVAL)),
+                vol.Required(
+                    CONF_INVENTORY_SCAN_INTERVAL,
+                    default=options.get(
+                        CONF_INVENTORY_SCAN_INTERVAL, INVENTORY_SCAN_INTERVAL
+                    ),
+                ): vol.All(
+                    vol.Coerce(int),
+                    vol.Range(min=MIN_SCAN_INTERVAL, max=MAX_SCAN_INTERVAL),
+                ),
+                vol.Required(
+                    CONF_CONSIDER_HOME,
+                    default=options.get(CONF_CONSIDER_HOME, CONSIDER_HOME),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Required(
+                    CONF_MIN_ONLINE,
+                    default=options.get(CONF_MIN_ONLINE, MIN_ONLINE),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Required(
+                    CONF_CLIENT_RATE_SENSORS,
+                    default=options.get(CONF_CLIENT_RATE_SENSORS, False),
+                ): bool,
+                vol.Required(
+                    CONF_OFFLOAD_THRESHOLD,
+                    default=options.get(CONF_OFFLOAD_THRESHOLD, OFFLOAD_THRESHOLD),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Required(
+                    CONF_FULL_ATTRIBUTES,
+                    default=options.get(CONF_FULL_ATTRIBUTES, False),
+                ): bool,
+                vol.Required(
+                    CONF_EXCLUDED_ATTRIBUTES,
+                    default=options.get(
+                        CONF_EXCLUDED_ATTRIBUTES, DEFAULT_EXCLUDED_ATTRIBUTES
+                    ),
+                ): cv.multi_select(
+                    {attribute: attribute for attribute in HIGH_CHURN_ATTRIBUTES}
+                ),
+                vol.Required(
+                    CONF_WAN_STATISTICS_WINDOWS,
+                    default=options.get(
+                        CONF_WAN_STATISTICS_WINDOWS, WAN_STATISTICS_WINDOWS
+                    ),
+                ): cv.multi_select(WAN_STATISTICS_WINDOW_OPTIONS),
+                vol.Required(
+                    CONF_RECORD_PAYLOADS,
+                    default=options.get(CONF_RECORD_PAYLOADS, False),
+                ): bool,
+                vol.Required(
+                    CONF_RECORD_HASH_IDENTIFIERS,
+                    default=options.get(CONF_RECORD_HASH_IDENTIFIERS, True),
+                ): bool,
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=options_schema)
 
 
 class InvalidHost(exceptions.HomeAssistantError):
     """Error to indicate there is an invalid hostname."""
+
+
+class InvalidAuth(exceptions.HomeAssistantError):
+    """Error to indicate the router rejected the password."""
+
+
+class ValidationStepFailed(exceptions.HomeAssistantError):
+    """Error to indicate a step of the connection test failed."""
+
+    def __init__(self, step, error, timings):
+        """Initialise with the failed step, its error and the step timings."""
+        super().__init__(f"{step}: {error}")
+        self.step = step
+        self.error = error
+        self.timings = timings
@@ -4,5 +4,120 @@ DOMAIN = "amplifi"
 COORDINATOR = "coordinator"
 ENTITIES = "entities"
 COORDINATOR_LISTENER = "coordinator-listener"
+SCHEDULER = "scheduler"
+# Host -> session the config flow logged in with, taken by the new entry
+VALIDATED_SESSIONS = "validated_sessions"
 CONF_ENABLE_NEW_DEVICES = "enable_new_devices"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_WAN_SCAN_INTERVAL = "wan_scan_interval"
+CONF_INVENTORY_SCAN_INTERVAL = "inventory_scan_interval"
+CONF_OFFLOAD_THRESHOLD = "offload_threshold"
+CONF_FULL_ATTRIBUTES = "full_attributes"
+CONF_EXCLUDED_ATTRIBUTES = "excluded_attributes"
+CONF_CONSIDER_HOME = "consider_home"
+CONF_MIN_ONLINE = "min_online"
+CONF_CLIENT_RATE_SENSORS = "client_rate_sensors"
+CONF_WAN_STATISTICS_WINDOWS = "wan_statistics_windows"
+CONF_RECORD_PAYLOADS = "record_payloads"
+CONF_RECORD_HASH_IDENTIFIERS = "record_hash_identifiers"
 SCAN_INTERVAL = 10
+MIN_SCAN_INTERVAL = 2
+# Shortest time between two polls of the tier scheduling
+MIN_POLL_SPACING = MIN_SCAN_INTERVAL / 2
+MAX_SCAN_INTERVAL = 300
+# 0 polls the WAN rates together with the devices
+WAN_SCAN_INTERVAL = 0
+INVENTORY_SCAN_INTERVAL = 60
+# Seconds a wifi device has to be gone before it is away, and has to be
+# connected before it is home
+CONSIDER_HOME = 180
+MIN_ONLINE = 0
+# Size in KiB from which responses are decoded in an executor, 0 never does
+OFFLOAD_THRESHOLD = 64
+# Adaptive polling: number of fast polls after a change, number of quiet polls
+# before slowing down and how many times the interval may grow while quiet
+ADAPTIVE_FAST_POLLS = 3
+ADAPTIVE_QUIET_POLLS = 6
+ADAPTIVE_QUIET_FACTOR = 4
+BACKOFF_MAX_INTERVAL = 300
+# Routers polled at the same time at most and the seconds between the start
+# of the polls of two routers
+MAX_CONCURRENT_POLLS = 4
+POLL_STAGGER = 1
+# Consecutive failed polls that open the circuit breaker of a router and the
+# seconds before the first probe of its login page, doubled after every failed
+# probe up to BACKOFF_MAX_INTERVAL
+BREAKER_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 30
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+BREAKER_STATES = [BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN]
+# Seconds between the start of a poll and one requested by the refresh service
+REFRESH_MIN_SPACING = MIN_SCAN_INTERVAL
+SERVICE_REFRESH = "refresh"
+ATTR_ENTRY_ID = "entry_id"
+ATTR_PRESENCE_ONLY = "presence_only"
+# A WAN rate change counts as a spike when it changes by this ratio and Mbps
+WAN_SPIKE_RATIO = 2
+WAN_SPIKE_MIN_MBPS = 5
+
+# Polling tiers: WAN rates, connected devices and the full inventory/topology
+TIER_WAN = "wan"
+TIER_PRESENCE = "presence"
+TIER_INVENTORY = "inventory"
+# Value of "do" posted to info-async.php for each tier. The light requests are
+# probed and replaced by a full request when the firmware does not support them
+INFO_MODE_FULL = "full"
+INFO_MODES = {TIER_WAN: "wan", TIER_PRESENCE: "devices", TIER_INVENTORY: INFO_MODE_FULL}
+# A light request that fails this many polls in a row, other than by a transport
+# error, is dropped even when the full requests retrying it fail too
+LIGHT_REQUEST_MAX_FAILURES = 3
+# Time of the last poll that saw a device, stamped on every poll that
+# refreshes the devices unless it is excluded
+LAST_SEEN = "last_seen"
+# Device tracker attributes that change on almost every poll and can be left
+# out of the state; the byte counters are by default
+HIGH_CHURN_ATTRIBUTES = [
+    LAST_SEEN,
+    "SignalQuality",
+    "RxBitrate",
+    "TxBitrate",
+    "RxBytes",
+    "TxBytes",
+    "rx_bitrate",
+    "tx_bitrate",
+    "rx_bytes",
+    "tx_bytes",
+]
+DEFAULT_EXCLUDED_ATTRIBUTES = ["RxBytes", "TxBytes", "rx_bytes", "tx_bytes"]
+STORAGE_VERSION = 1
+# Seconds to wait before persisting the last snapshot after a poll
+STORAGE_SAVE_DELAY = 300
+# Events fired once per poll with every device that joined, left or roamed
+EVENT_DEVICE_JOINED = f"{DOMAIN}_device_joined"
+EVENT_DEVICE_LEFT = f"{DOMAIN}_device_left"
+EVENT_DEVICE_ROAMED = f"{DOMAIN}_device_roamed"
+# Subscription key of the entities showing the poll statistics
+POLL_STATS_KEY = "poll_stats"
+# Subscriptions of the client rate sensors are keyed (CLIENT_RATE_KEY, mac)
+CLIENT_RATE_KEY = "client_rate"
+# Seconds without a counter change after which a client rate drops to 0
+CLIENT_RATE_IDLE = 30
+# Subscriptions of the mesh point sensors are keyed (MESH_POINT_KEY, mac)
+MESH_POINT_KEY = "mesh_point"
+# Windows in minutes of the rolling WAN statistics sensors
+WAN_STATISTICS_WINDOW_OPTIONS = {"1": "1 minute", "15": "15 minutes", "60": "1 hour"}
+WAN_STATISTICS_WINDOWS = ["15"]
+# Channels of the WAN rate history, keys of the snapshot's wan_speeds
+WAN_DIRECTIONS = ("download", "upload")
+# Subscription key of the rolling WAN statistics sensors
+WAN_STATISTICS_KEY = "wan_statistics"
+# Subscription key of the daily and monthly WAN data usage sensors
+DATA_USAGE_KEY = "data_usage"
+# Subscription key of the circuit breaker sensor
+BREAKER_KEY = "breaker"
+# Recording of the raw responses, in the configuration directory
+RECORDING_FILE = f"{DOMAIN}-recording-{{entry_id}}.jsonl.gz"
+# Number of polls kept for the rolling latency and size statistics
+POLL_STATS_WINDOW = 100
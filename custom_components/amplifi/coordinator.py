@@ -1,174 +1,878 @@
 """The Amplifi coordinator."""
+import asyncio
 import logging
+import math
+import time
 import aiohttp
-from async_timeout import timeout
 
-from aiohttp.client_exceptions import ClientConnectorError
 from datetime import timedelta
 
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_SCAN_INTERVAL
+from homeassistant.core import CALLBACK_TYPE, callback
 from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN
-from .client import AmplifiClient, AmplifiClientError
+from .const import (
+    BACKOFF_MAX_INTERVAL,
+    BREAKER_KEY,
+    BREAKER_OPEN,
+    BREAKER_RESET_TIMEOUT,
+    BREAKER_THRESHOLD,
+    CONF_ADAPTIVE_POLLING,
+    CONF_CLIENT_RATE_SENSORS,
+    CONF_CONSIDER_HOME,
+    CONF_EXCLUDED_ATTRIBUTES,
+    CONF_FULL_ATTRIBUTES,
+    CONF_INVENTORY_SCAN_INTERVAL,
+    CONF_MIN_ONLINE,
+    CONF_OFFLOAD_THRESHOLD,
+    CONF_RECORD_HASH_IDENTIFIERS,
+    CONF_RECORD_PAYLOADS,
+    CONF_WAN_SCAN_INTERVAL,
+    CONF_WAN_STATISTICS_WINDOWS,
+    CLIENT_RATE_IDLE,
+    CLIENT_RATE_KEY,
+    CONSIDER_HOME,
+    DATA_USAGE_KEY,
+    DEFAULT_EXCLUDED_ATTRIBUTES,
+    DOMAIN,
+    EVENT_DEVICE_JOINED,
+    EVENT_DEVICE_LEFT,
+    EVENT_DEVICE_ROAMED,
+    INFO_MODE_FULL,
+    INFO_MODES,
+    INVENTORY_SCAN_INTERVAL,
+    LAST_SEEN,
+    LIGHT_REQUEST_MAX_FAILURES,
+    MESH_POINT_KEY,
+    MIN_POLL_SPACING,
+    MIN_ONLINE,
+    OFFLOAD_THRESHOLD,
+    POLL_STATS_KEY,
+    POLL_STATS_WINDOW,
+    RECORDING_FILE,
+    REFRESH_MIN_SPACING,
+    SCAN_INTERVAL,
+    SCHEDULER,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+    TIER_INVENTORY,
+    TIER_PRESENCE,
+    TIER_WAN,
+    WAN_SCAN_INTERVAL,
+    WAN_SPIKE_MIN_MBPS,
+    WAN_DIRECTIONS,
+    WAN_SPIKE_RATIO,
+    WAN_STATISTICS_KEY,
+    WAN_STATISTICS_WINDOWS,
+)
+from .breaker import CircuitBreaker
+from .client import AmplifiClient, AmplifiClientError, AmplifiTimeoutError
+from .events import device_summary, roam_summary
+from .polling import AdaptivePollInterval, PollTiers, tier_covers
+from .presence import PresenceTracker
+from .recording import PayloadRecorder
+from .snapshot import (
+    WAN_PORT,
+    AmplifiDiff,
+    AmplifiSnapshot,
+    build_snapshot,
+    diff_snapshots,
+    is_full_payload,
+    is_partial_payload,
+    update_snapshot,
+)
+from .stats import METRIC_LOOP_BLOCKED, STAGE_EXTRACT, PollStats
+from .throughput import ClientRates, RateHistory
+from .topology import MeshIndex
+from .usage import DataUsage
 
 _LOGGER = logging.getLogger(__name__)
 
-WIFI_DEVICES_IDX = 1
-DEVICES_INFO_IDX = 2
-ETHERNET_PORT_TO_DEVICE_IDX = 3
-ETHERNET_PORTS_IDX = 4
 
-
-class AmplifiDataUpdateCoordinator(DataUpdateCoordinator):
+class AmplifiDataUpdateCoordinator(DataUpdateCoordinator[AmplifiSnapshot]):
     """Class to manage fetching Amplifi data from router."""
 
-    def __init__(self, hass, hostname, password):
+    def __init__(self, hass, config_entry: ConfigEntry):
         """Initialize."""
-        self._hostname = hostname
-        self._password = password
-        self._wifi_devices = {}
-        self._ethernet_ports = {}
-        self._ethernet_devices = {}
-        self._wan_speeds = {"download": 0, "upload": 0}
-        self._router_mac_addr = None
+        self._entry_id = config_entry.entry_id
+        self._scheduler = hass.data[DOMAIN][SCHEDULER]
+        config_entry.async_on_unload(self._scheduler.async_add_router(self._entry_id))
+        self._hostname = config_entry.data[CONF_HOST]
+        self._password = config_entry.data[CONF_PASSWORD]
+        self._last_diff = AmplifiDiff(full=True)
+        self._subscribers = {}
+        # Last snapshot and session are cached so entities exist before login
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{config_entry.entry_id}")
+        self._restored = False
+        # Time of the last successful poll and of the last two that refreshed
+        # the devices, WAN polls do not
+        self._poll_time = None
+        self._seen_time = self._previous_seen_time = None
+        # Keys whose last_seen attribute was stamped by the last poll
+        self._seen_keys = frozenset()
         # Create jar for storing session cookies
         self._jar = aiohttp.CookieJar(unsafe=True)
         # Amplifi uses session cookie so we need a we client with a cookie jar
         self._client_sesssion = async_create_clientsession(
             hass, False, True, cookie_jar=self._jar
         )
+        self._stats = PollStats(POLL_STATS_WINDOW)
+        # Random key of the pseudonyms of the recording, kept in the store even
+        # while recording is off so devices keep their pseudonyms
+        self._recording_secret = None
+        self._recorder = None
+        if config_entry.options.get(CONF_RECORD_PAYLOADS, False):
+            self._recorder = PayloadRecorder(
+                hass.config.path(RECORDING_FILE.format(entry_id=self._entry_id)),
+                config_entry.options.get(CONF_RECORD_HASH_IDENTIFIERS, True),
+            )
+            self._recording_secret = self._recorder.secret
         self._client = AmplifiClient(
-            self._client_sesssion, self._hostname, self._password
+            self._client_sesssion,
+            self._hostname,
+            self._password,
+            self._stats,
+            self._recorder,
+        )
+
+        # Polls fail at once while the router keeps failing, see CircuitBreaker
+        self._breaker = CircuitBreaker(
+            BREAKER_THRESHOLD, BREAKER_RESET_TIMEOUT, BACKOFF_MAX_INTERVAL
         )
 
-        # TODO: Make this a configurable value
-        update_interval = timedelta(seconds=10)
-        _LOGGER.debug("Data will be update every %s", update_interval)
+        self._poll_interval = AdaptivePollInterval(
+            config_entry.options.get(CONF_SCAN_INTERVAL, SCAN_INTERVAL),
+            config_entry.options.get(CONF_ADAPTIVE_POLLING, False),
+        )
+        self._tiers = PollTiers(
+            {
+                TIER_WAN: config_entry.options.get(
+                    CONF_WAN_SCAN_INTERVAL, WAN_SCAN_INTERVAL
+                ),
+                TIER_PRESENCE: self._poll_interval.interval,
+                TIER_INVENTORY: config_entry.options.get(
+                    CONF_INVENTORY_SCAN_INTERVAL, INVENTORY_SCAN_INTERVAL
+                ),
+            }
+        )
+        self._presence = PresenceTracker(
+            config_entry.options.get(CONF_CONSIDER_HOME, CONSIDER_HOME),
+            config_entry.options.get(CONF_MIN_ONLINE, MIN_ONLINE),
+        )
+        # Last record of the home devices that are gone, for their left event
+        self._departed = {}
+        # Cancels the timer of the next presence deadline and when it is due
+        self._presence_timer = None
+        self._presence_deadline = None
+        config_entry.async_on_unload(self._async_cancel_presence_timer)
+        # Client rates feed the mesh point sensors, their own sensors are optional
+        self._client_rates = ClientRates(CLIENT_RATE_IDLE)
+        self._client_rate_sensors = config_entry.options.get(
+            CONF_CLIENT_RATE_SENSORS, False
+        )
+        self._rates_changed = set()
+        self._mesh_index = MeshIndex()
+        self._mesh_changed = set()
+        # Poll running and poll requested by the refresh service, with its tier
+        self._poll_in_flight = None
+        self._requested_poll = None
+        self._requested_tier = None
+        self._forced_tier = None
+        # Start and tier of the running or last poll, None until it is known
+        self._last_poll_start = None
+        self._poll_tier = None
+        # Rolling statistics of the WAN rates, sized for the fastest polling.
+        # Polls closer than that, e.g. manual refreshes, are left out
+        windows = [
+            int(minutes) * 60
+            for minutes in config_entry.options.get(
+                CONF_WAN_STATISTICS_WINDOWS, WAN_STATISTICS_WINDOWS
+            )
+        ]
+        self._wan_history = RateHistory(
+            windows,
+            math.ceil(max(windows, default=0) / MIN_POLL_SPACING) + 1,
+            min_spacing=MIN_POLL_SPACING,
+        )
+        # Daily and monthly WAN traffic, persisted with the snapshot
+        self._data_usage = DataUsage()
+        # Request modes of each tier, light ones are dropped when unsupported
+        self._info_modes = dict(INFO_MODES)
+        # Tier -> light requests that failed in a row, other than in transport
+        self._light_failures = {}
+        # Keep every attribute the router reports, not only the record fields
+        self._full_attributes = config_entry.options.get(CONF_FULL_ATTRIBUTES, False)
+        # High churn attributes left out of the state of the device trackers
+        self.excluded_attributes = frozenset(
+            config_entry.options.get(
+                CONF_EXCLUDED_ATTRIBUTES, DEFAULT_EXCLUDED_ATTRIBUTES
+            )
+        )
+        # Responses of at least this many bytes are processed in an executor
+        self._offload_bytes = (
+            config_entry.options.get(CONF_OFFLOAD_THRESHOLD, OFFLOAD_THRESHOLD) * 1024
+        )
+        update_interval = timedelta(seconds=self._poll_interval.interval)
+        _LOGGER.debug(
+            "Data will be update every %s (adaptive=%s, tiers=%s)",
+            timedelta(seconds=self._poll_interval.interval),
+            self._poll_interval.adaptive,
+            self._tiers.intervals,
+        )
 
         super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=update_interval)
-        super().async_add_listener(self.extract_wifi_devices)
-        super().async_add_listener(self.extract_ethernet_ports)
-        super().async_add_listener(self.extract_ethernet_devices)
-        super().async_add_listener(self.extract_wan_speeds)
 
     async def _async_update_data(self):
         """Update data via library."""
         try:
-            async with timeout(10):
-                devices = await self._client.async_get_devices()
-        except (AmplifiClientError, ClientConnectorError) as error:
-            raise UpdateFailed(error) from error
-        return devices
-
-    def extract_wifi_devices(self):
-        """Extract wifi devices from raw response after a successful update."""
-        if self.data is None:
-            return
-        wifi_devices = {}
-        raw_wifi_devices = self.data[WIFI_DEVICES_IDX]
-        if raw_wifi_devices:
-            for access_point in raw_wifi_devices:
-                for wifi_band in raw_wifi_devices[access_point]:
-                    for network_type in raw_wifi_devices[access_point][wifi_band]:
-                        for macAddr in raw_wifi_devices[access_point][wifi_band][
-                            network_type
-                        ]:
-                            device_info = raw_wifi_devices[access_point][wifi_band][
-                                network_type
-                            ][macAddr]
-                            device_info["connected_to"] = access_point
-                            wifi_devices[macAddr] = device_info
-
-        self._wifi_devices = wifi_devices
-
-    def extract_ethernet_ports(self):
-        if self.data is None:
+            return await self._async_poll()
+        except BaseException:
+            # Whatever failed the poll, listeners are only called when the
+            # router just went down and then every entity is unavailable
+            self._last_diff = AmplifiDiff(full=True)
+            # Stages of a poll that did not finish must not leak into the next
+            self._stats.abort_poll()
+            raise
+
+    async def _async_poll(self):
+        """Poll the router and update the state derived from its data."""
+        now = self._last_poll_start = time.monotonic()
+        self._poll_tier = None
+        # A requested tier only applies to this poll, even when it is skipped
+        forced_tier, self._forced_tier = self._forced_tier, None
+        if self._breaker.state == BREAKER_OPEN and not self._breaker.probe_due(now):
+            # The router is left alone until the next probe
+            raise UpdateFailed("Circuit breaker is open, router not polled")
+
+        tier = self._poll_tier = forced_tier or self._tiers.due(now)
+        self._stats.start_poll()
+        try:
+            # Waiting for a slot does not count towards the client timeouts
+            async with self._scheduler.slot(self._entry_id):
+                if self._breaker.state == BREAKER_OPEN:
+                    self._breaker.start_probe()
+                    self._async_notify(BREAKER_KEY)
+                    await self._client.async_probe()
+                    _LOGGER.debug("Router answers again, closing the circuit breaker")
+                    self._breaker.success()
+                snapshot, tier, diff = await self._async_fetch(tier)
+                self._poll_tier = tier
+        except (
+            AmplifiClientError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as error:
+            self._scheduler.async_poll_failed(
+                self._entry_id, str(error) or type(error).__name__
+            )
+            self.update_interval = self._poll_interval.failure()
+            if self._breaker.failure(time.monotonic()):
+                _LOGGER.debug(
+                    "Circuit breaker open, probing the router in %s s",
+                    self._breaker.reset_timeout,
+                )
+            if self._breaker.state == BREAKER_OPEN:
+                # The next poll is the probe
+                self.update_interval = max(
+                    self.update_interval,
+                    timedelta(seconds=self._breaker.reset_timeout),
+                )
+            self._stats.finish_poll(time.monotonic() - now)
+            if not self.last_update_success:
+                # Listeners are not called again while the router stays down
+                self._async_notify(POLL_STATS_KEY)
+                self._async_notify(BREAKER_KEY)
+            raise UpdateFailed(str(error) or "Timeout fetching data") from error
+
+        self._scheduler.async_poll_succeeded(self._entry_id)
+        self._breaker.success()
+        if not self.last_update_success or self._restored:
+            # Every entity has to drop its unavailable or restored state
+            diff = AmplifiDiff(diff.added, diff.removed, diff.changed, full=True)
+        self._restored = False
+        self._poll_time = dt_util.now()
+        self._seen_keys = frozenset()
+        if tier != TIER_WAN:
+            self._previous_seen_time, self._seen_time = self._seen_time, self._poll_time
+            if LAST_SEEN not in self.excluded_attributes:
+                # The devices of the poll need a new last_seen, changed or not
+                self._seen_keys = frozenset(snapshot.items())
+        self._observe_presence(diff, snapshot, time.monotonic())
+        if tier != TIER_WAN:
+            # WAN polls do not refresh the counters of the clients
+            self._rates_changed = self._client_rates.update(
+                snapshot.wifi_devices, time.monotonic()
+            )
+        self._update_mesh_index(snapshot, diff.updated | self._rates_changed)
+        self._wan_history.add(
+            time.monotonic(),
+            [snapshot.wan_speeds[direction] for direction in WAN_DIRECTIONS],
+        )
+        wan_port = snapshot.ethernet_ports.get(WAN_PORT, {})
+        self._data_usage.update(
+            self._poll_time,
+            (wan_port["rx_bytes"], wan_port["tx_bytes"])
+            if "rx_bytes" in wan_port and "tx_bytes" in wan_port
+            else None,
+            [snapshot.wan_speeds[direction] for direction in WAN_DIRECTIONS],
+        )
+        self._last_diff = diff
+        self._store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+        self._schedule_tiers(
+            tier,
+            now,
+            bool(diff.added or diff.removed) or self._is_wan_spike(snapshot),
+        )
+        _LOGGER.debug(
+            "tier=%s diff added=%s removed=%s changed=%s full=%s",
+            tier,
+            len(diff.added),
+            len(diff.removed),
+            len(diff.changed),
+            diff.full,
+        )
+        self._stats.finish_poll(
+            time.monotonic() - now,
+            len(snapshot.wifi_devices) + len(snapshot.ethernet_devices),
+        )
+        return snapshot
+
+    async def _async_refresh(self, *args, **kwargs):
+        """Refresh data, requested polls join the one in flight."""
+        poll = self._poll_in_flight = self.hass.loop.create_future()
+        try:
+            await super()._async_refresh(*args, **kwargs)
+        finally:
+            poll.set_result(None)
+            if self._poll_in_flight is poll:
+                self._poll_in_flight = None
+
+    async def async_request_poll(self, presence_only=False):
+        """Poll the router now, for the refresh service.
+
+        A call while a poll of at least the requested tier is running waits
+        for that poll and calls while a poll is requested share it, the
+        heaviest requested tier is polled. The requested poll starts
+        REFRESH_MIN_SPACING seconds after the previous one at the earliest.
+        """
+        tier = TIER_PRESENCE if presence_only else TIER_INVENTORY
+        if self._poll_in_flight is not None and tier_covers(self._poll_tier, tier):
+            await asyncio.shield(self._poll_in_flight)
             return
-        router_mac_addr = self.get_router_mac_addr()
 
-        self._ethernet_ports = self.data[ETHERNET_PORTS_IDX][router_mac_addr]
-        _LOGGER.debug(f"ports={self.ethernet_ports}")
+        if self._requested_poll is None:
+            self._requested_tier = tier
+            self._requested_poll = self.config_entry.async_create_background_task(
+                self.hass,
+                self._async_requested_poll(time.monotonic()),
+                f"{DOMAIN} requested poll",
+            )
+        elif tier == TIER_INVENTORY:
+            self._requested_tier = tier
+        await asyncio.shield(self._requested_poll)
 
-    def extract_ethernet_devices(self):
-        """Try get additional device info for connected ethernet ports."""
-        if self.data is None:
+    async def _async_requested_poll(self, requested_at):
+        """Run the requested poll once the minimum spacing has passed."""
+        try:
+            if self._last_poll_start is not None:
+                delay = self._last_poll_start + REFRESH_MIN_SPACING - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Join a poll of the requested tier, wait for a lighter one to end
+            while self._poll_in_flight is not None:
+                covered = tier_covers(self._poll_tier, self._requested_tier)
+                await asyncio.shield(self._poll_in_flight)
+                if covered:
+                    return
+            if (
+                self._last_poll_start is None
+                or self._last_poll_start < requested_at
+                or not tier_covers(self._poll_tier, self._requested_tier)
+            ):
+                self._forced_tier = self._requested_tier
+                await self.async_refresh()
+        finally:
+            self._requested_poll = None
+
+    @callback
+    def _schedule_refresh(self):
+        """Schedule the next poll through the scheduler shared by the routers."""
+        if self._update_interval_seconds is None:
+            return
+
+        if self.config_entry and self.config_entry.pref_disable_polling:
             return
-        router_mac_addr = self.get_router_mac_addr()
-
-        if router_mac_addr in self.data[ETHERNET_PORT_TO_DEVICE_IDX]:
-            ethernet_devices = {}
-            raw_devices_info = self.data[DEVICES_INFO_IDX]
-            raw_device_to_eth_index = self.data[ETHERNET_PORT_TO_DEVICE_IDX][router_mac_addr]
-    
-            if raw_device_to_eth_index and raw_devices_info:
-                    for device in raw_device_to_eth_index:
-                        device_info = raw_devices_info[device]
-                        port = raw_device_to_eth_index[device]
-                        device_info["connected_to_port"] = port
-                        ethernet_devices[device] = device_info
-    
-            self._ethernet_devices = ethernet_devices
-    
-            _LOGGER.debug(f"ethernet_devices={self._ethernet_devices}")
+
+        self._async_unsub_refresh()
+        self._unsub_refresh = self._scheduler.async_schedule(
+            self._entry_id, self._update_interval_seconds, self._job
+        )
+
+    async def _async_fetch(self, tier):
+        """Fetch a snapshot using the lightest request that covers the tier.
+
+        Return the snapshot, the tier that was actually refreshed and the
+        diff with the previous snapshot.
+        """
+        previous = self.data
+        mode = self._info_modes.get(tier)
+        if previous is None or previous.router_mac is None or mode is None:
+            tier, mode = TIER_INVENTORY, INFO_MODE_FULL
+
+        if mode != INFO_MODE_FULL:
+            reauths = self._client.counters["reauth"]
+            try:
+                body = await self._client.async_get_devices(mode, decode=False)
+                result = await self._async_process(body, tier, previous)
+            except (AmplifiTimeoutError, aiohttp.ClientError, asyncio.TimeoutError):
+                # Transport errors fail the poll, they say nothing of the firmware
+                raise
+            except AmplifiClientError as error:
+                # Refused, empty or not JSON: a full request tells whether the
+                # router or the light request is at fault
+                _LOGGER.debug(
+                    "'%s' request failed (%s), retrying with a full request",
+                    mode,
+                    error,
+                )
+                try:
+                    body = await self._client.async_get_devices(
+                        INFO_MODE_FULL, decode=False
+                    )
+                    result = await self._async_process(body, TIER_INVENTORY, previous)
+                except AmplifiClientError as retry_error:
+                    # Only broken bodies count, the router may be down otherwise
+                    if isinstance(retry_error.__cause__, ValueError):
+                        failures = self._light_failures.get(tier, 0) + 1
+                        self._light_failures[tier] = failures
+                        if failures >= LIGHT_REQUEST_MAX_FAILURES:
+                            self._drop_info_mode(tier)
+                    raise
+                if self._client.counters["reauth"] == reauths:
+                    # The session was valid, the router refuses the light request
+                    self._drop_info_mode(tier)
+                return result
+
+            if result is not None and result[1] == tier:
+                self._light_failures.pop(tier, None)
+                return result
+
+            # The firmware answered with a full or an unusable payload
+            self._drop_info_mode(tier)
+            if result is not None:
+                return result
+
+        body = await self._client.async_get_devices(INFO_MODE_FULL, decode=False)
+        return await self._async_process(body, TIER_INVENTORY, previous)
+
+    def _drop_info_mode(self, tier):
+        """Use full requests for a tier whose light request is unsupported."""
+        _LOGGER.info(
+            "Router does not support '%s' requests, using full requests for %s",
+            self._info_modes.pop(tier),
+            tier,
+        )
+        self._light_failures.pop(tier, None)
+        if tier == TIER_WAN:
+            # A full payload every few seconds would cost more than it saves
+            self._tiers.set_interval(TIER_WAN, None, time.monotonic())
+
+    async def _async_process(self, body, tier, previous):
+        """Decode and normalise a response, in an executor when it is large.
+
+        The event loop only receives the finished snapshot of large payloads,
+        the time it is blocked by the others is recorded.
+        """
+        if self._offload_bytes and len(body) >= self._offload_bytes:
+            self._stats.add_time(METRIC_LOOP_BLOCKED, 0)
+            return await self.hass.async_add_executor_job(
+                self._process, body, tier, previous
+            )
+
+        start = time.perf_counter()
+        try:
+            return self._process(body, tier, previous)
+        finally:
+            self._stats.add_time(METRIC_LOOP_BLOCKED, time.perf_counter() - start)
+
+    def _process(self, body, tier, previous):
+        """Return the snapshot, refreshed tier and diff for a response body.
+
+        A light response of the tier is applied to the previous snapshot, a
+        full one is used as is. Return None when a light response is valid
+        JSON but neither, a body that does not decode raises.
+        Runs in an executor, so it must only use its arguments and the stats.
+        """
+        if tier == TIER_INVENTORY:
+            snapshot = self._extract(
+                build_snapshot,
+                self._client.decode_devices(body),
+                self._full_attributes,
+            )
         else:
-            _LOGGER.debug(f"No ethernet devices found")
+            devices = self._client.decode_devices(body)
+            if is_partial_payload(devices, tier, previous.router_mac):
+                snapshot = self._extract(
+                    update_snapshot, previous, devices, tier, self._full_attributes
+                )
+            elif is_full_payload(devices):
+                snapshot = self._extract(
+                    build_snapshot, devices, self._full_attributes
+                )
+                tier = TIER_INVENTORY
+            else:
+                return None
+
+        return snapshot, tier, self._extract(diff_snapshots, previous, snapshot)
+
+    def _extract(self, extract, *args):
+        """Run an extraction step and record the time it took."""
+        start = time.perf_counter()
+        try:
+            return extract(*args)
+        finally:
+            self._stats.add_time(STAGE_EXTRACT, time.perf_counter() - start)
+
+    def _schedule_tiers(self, tier, now, changed):
+        """Schedule the next poll after the given tier was refreshed."""
+        if tier != TIER_WAN or changed:
+            presence_interval = self._poll_interval.success(changed)
+            self._tiers.set_interval(
+                TIER_PRESENCE, presence_interval.total_seconds(), now
+            )
+        self._tiers.completed(tier, now)
+        self.update_interval = timedelta(
+            seconds=self._tiers.next_delay(time.monotonic())
+        )
+
+    @callback
+    def _update_mesh_index(self, snapshot, macs):
+        """Refresh the mesh points and the aggregates of the clients in macs."""
+        self._mesh_changed = self._mesh_index.set_topology(snapshot.mesh_points)
+        self._mesh_changed |= self._mesh_index.update(
+            snapshot.wifi_devices, macs, self.client_rate
+        )
+
+    @callback
+    def _observe_presence(self, diff, snapshot, now):
+        """Feed the wifi devices that joined or left to the presence tracker.
+
+        Fire the join, leave and roam events of the poll, one of each at most.
+        """
+        initial = self.data is None
+        previous_devices = self.data.wifi_devices if self.data else {}
+        current_devices = snapshot.wifi_devices
+        joined = [mac for mac in diff.added if mac in current_devices]
+        left = [mac for mac in diff.removed if mac in previous_devices]
+
+        roamed = []
+        for mac in diff.changed:
+            if mac in current_devices and mac in previous_devices:
+                roamed.append(
+                    roam_summary(previous_devices[mac], current_devices[mac])
+                )
+        for mac in joined:
+            # Came back before consider_home ran out, maybe somewhere else
+            departed = self._departed.pop(mac, None)
+            if departed is not None:
+                roamed.append(roam_summary(departed, current_devices[mac]))
+        for mac in left:
+            if self._presence.is_home(mac):
+                self._departed[mac] = previous_devices[mac]
+
+        changed = self._presence.observe(joined, left, now, initial)
+        self._async_schedule_presence_timer()
+        if initial:
             return
+        self._async_fire_presence_events(changed, current_devices)
+        roamed = [summary for summary in roamed if summary is not None]
+        if roamed:
+            self._async_fire(EVENT_DEVICE_ROAMED, roamed)
 
-    def extract_wan_speeds(self):
-        if self.data is None:
+    @callback
+    def _async_fire_presence_events(self, changed, current_devices):
+        """Fire the events of the devices that became home or away."""
+        joined, left = [], []
+        for mac in sorted(changed):
+            if self._presence.is_home(mac):
+                joined.append(device_summary(current_devices[mac]))
+            else:
+                departed = self._departed.pop(mac, None)
+                left.append(device_summary(departed) if departed else {"mac": mac})
+        if joined:
+            self._async_fire(EVENT_DEVICE_JOINED, joined)
+        if left:
+            self._async_fire(EVENT_DEVICE_LEFT, left)
+
+    @callback
+    def _async_fire(self, event_type, devices):
+        self.hass.bus.async_fire(
+            event_type, {"entry_id": self._entry_id, "devices": devices}
+        )
+
+    @callback
+    def _async_schedule_presence_timer(self):
+        """Make sure the timer fires at the next presence deadline."""
+        deadline = self._presence.next_deadline()
+        if deadline == self._presence_deadline:
             return
-        router_mac_addr = self.get_router_mac_addr()
-
-        wan_port_data = self.data[ETHERNET_PORTS_IDX][router_mac_addr]["eth-0"]
-        if "rx_bitrate" in wan_port_data:
-            self._wan_speeds["download"] = (
-                wan_port_data["rx_bitrate"] == 0
-                if 0
-                else wan_port_data["rx_bitrate"] / 1024
-            )
-        if "tx_bitrate" in wan_port_data and wan_port_data["tx_bitrate"] != 0:
-            self._wan_speeds["upload"] = (
-                wan_port_data["tx_bitrate"] == 0
-                if 0
-                else wan_port_data["tx_bitrate"] / 1024
+        self._async_cancel_presence_timer()
+        if deadline is not None:
+            self._presence_deadline = deadline
+            self._presence_timer = async_call_later(
+                self.hass,
+                max(deadline - time.monotonic(), 0),
+                self._async_presence_timeout,
             )
 
-        _LOGGER.debug(f"wan_speeds={self._wan_speeds}")
+    @callback
+    def _async_cancel_presence_timer(self):
+        if self._presence_timer is not None:
+            self._presence_timer()
+        self._presence_timer = self._presence_deadline = None
+
+    @callback
+    def _async_presence_timeout(self, _now):
+        """Complete the due presence transitions and update their entities."""
+        # The loop may run the timer a little before the deadline
+        now = max(time.monotonic(), self._presence_deadline)
+        self._presence_timer = self._presence_deadline = None
+        changed = self._presence.expire(now)
+        for mac in changed:
+            self._async_notify(mac)
+        self._async_fire_presence_events(changed, self.wifi_devices)
+        self._async_schedule_presence_timer()
 
-    def find_router_mac_in_topology(self, topology_data):
-        for k, v in topology_data.items():
-            if k == "role" and v == "Router" and "mac" in topology_data:
-                self._router_mac_addr = topology_data["mac"]
-            elif isinstance(v, dict):
-                self.find_router_mac_in_topology(v)
-                
+    def _is_wan_spike(self, snapshot):
+        """Return True when a WAN rate jumped compared to the previous poll."""
+        if self.data is None:
+            return False
+        for direction, speed in snapshot.wan_speeds.items():
+            previous = self.data.wan_speeds.get(direction, 0)
+            low, high = sorted((previous, speed))
+            if high - low >= WAN_SPIKE_MIN_MBPS and high >= low * WAN_SPIKE_RATIO:
+                return True
+        return False
+
+    async def async_restore(self):
+        """Load the cached snapshot and session, return False if there is none."""
+        cache = await self._store.async_load()
+        if not cache:
+            return False
 
-    def get_router_mac_addr(self):
-        if self._router_mac_addr is None:
-            self.find_router_mac_in_topology(self.data[0])
+        if cache.get("recording_secret"):
+            try:
+                self._recording_secret = bytes.fromhex(cache["recording_secret"])
+            except (TypeError, ValueError) as error:
+                _LOGGER.warning("Ignoring invalid cached recording secret: %s", error)
+            else:
+                if self._recorder is not None:
+                    self._recorder.secret = self._recording_secret
 
-        return self._router_mac_addr
+        if cache.get("data_usage"):
+            try:
+                self._data_usage.restore(cache["data_usage"])
+            except (KeyError, TypeError, ValueError) as error:
+                _LOGGER.warning("Ignoring invalid cached data usage: %s", error)
+
+        try:
+            snapshot = AmplifiSnapshot.from_dict(cache["snapshot"])
+            self._client.restore_session(cache.get("session"))
+            if cache.get("poll_time"):
+                self._poll_time = dt_util.parse_datetime(cache["poll_time"])
+                self._seen_time = self._poll_time
+        except (KeyError, TypeError, ValueError) as error:
+            _LOGGER.warning("Ignoring invalid cached data: %s", error)
+            return False
 
-    def async_stop_refresh(self):
-        super._async_stop_refresh()
+        _LOGGER.debug("Restored snapshot with %s items", len(snapshot.items()))
+        self._restored = True
+        self._presence.observe(snapshot.wifi_devices, (), time.monotonic(), True)
+        self._update_mesh_index(snapshot, snapshot.wifi_devices)
+        self._last_diff = AmplifiDiff(added=frozenset(snapshot.items()), full=True)
+        self.async_set_updated_data(snapshot)
+        return True
+
+    @callback
+    def async_adopt_session(self, session):
+        """Poll with a session that was logged in elsewhere, e.g. the config flow."""
+        self._client.restore_session(session)
+
+    async def async_save(self):
+        """Persist the last snapshot and session immediately."""
+        if self.data is not None and not self._restored:
+            await self._store.async_save(self._data_to_store())
+
+    @callback
+    def _data_to_store(self):
+        """Return the data persisted between restarts."""
+        return {
+            "snapshot": self.data.as_dict(),
+            "session": self._client.export_session(),
+            "poll_time": self._poll_time.isoformat() if self._poll_time else None,
+            "data_usage": self._data_usage.as_dict(),
+            "recording_secret": self._recording_secret.hex()
+            if self._recording_secret is not None
+            else None,
+        }
+
+    @callback
+    def async_subscribe(self, key, update_callback) -> CALLBACK_TYPE:
+        """Call update_callback whenever the item with the given key changes."""
+        subscribers = self._subscribers.setdefault(key, [])
+        subscribers.append(update_callback)
+
+        @callback
+        def remove_subscriber():
+            subscribers.remove(update_callback)
+            if not subscribers:
+                self._subscribers.pop(key, None)
+
+        return remove_subscriber
+
+    @callback
+    def async_update_listeners(self):
+        """Update all listeners and the subscribers of changed keys."""
+        super().async_update_listeners()
+
+        diff = self._last_diff
+        keys = list(self._subscribers) if diff.full else diff.updated | self._seen_keys
+        for key in keys:
+            self._async_notify(key)
+        if not diff.full:
+            # The statistics change with every poll
+            self._async_notify(POLL_STATS_KEY)
+            self._async_notify(BREAKER_KEY)
+            self._async_notify(WAN_STATISTICS_KEY)
+            self._async_notify(DATA_USAGE_KEY)
+            for mac in self._rates_changed:
+                self._async_notify((CLIENT_RATE_KEY, mac))
+            for mac in self._mesh_changed:
+                self._async_notify((MESH_POINT_KEY, mac))
+        self._rates_changed = set()
+        self._mesh_changed = set()
+
+    @callback
+    def _async_notify(self, key):
+        """Call the subscribers of a key."""
+        for update_callback in list(self._subscribers.get(key, ())):
+            update_callback()
+
+    @property
+    def poll_stats(self):
+        """Return the rolling statistics of the poll pipeline."""
+        return self._stats
+
+    @property
+    def breaker(self):
+        """Return the circuit breaker of the router."""
+        return self._breaker
+
+    @property
+    def health(self):
+        """Return the outcome of the last polls of the router."""
+        return self._scheduler.health[self._entry_id]
+
+    @property
+    def poll_counters(self):
+        """Return the login, re-auth and failure counters."""
+        return {**self._client.counters, **self._stats.counters}
+
+    @property
+    def poll_time(self):
+        """Return when the current data was polled."""
+        return self._poll_time
+
+    @property
+    def seen_time(self):
+        """Return when the devices of the current data were polled."""
+        return self._seen_time
+
+    @property
+    def previous_seen_time(self):
+        """Return when the devices were polled before seen_time."""
+        return self._previous_seen_time
+
+    @property
+    def client_rates_enabled(self):
+        """Return True when client rate sensors are wanted."""
+        return self._client_rate_sensors
+
+    def client_rate(self, mac):
+        """Return the RX and TX rate of a wifi client in Mbps."""
+        return self._client_rates.rates.get(mac, (0.0, 0.0))
+
+    @property
+    def mesh_points(self):
+        """Return the router and the satellites keyed by MAC address."""
+        return self._mesh_index.mesh_points
+
+    def mesh_point_stats(self, mac):
+        """Return the client count and throughput of a mesh point, if any."""
+        return self._mesh_index.stats.get(mac)
+
+    @property
+    def wan_statistics_windows(self):
+        """Return the windows of the rolling WAN statistics in seconds."""
+        return list(self._wan_history.windows)
+
+    def wan_statistics(self, seconds, direction):
+        """Return the mean, p95 and peak WAN rate in Mbps over a window."""
+        return self._wan_history.summary(
+            seconds, WAN_DIRECTIONS.index(direction)
+        )
+
+    def data_usage(self, period, direction):
+        """Return the WAN bytes of a direction in the current day or month."""
+        return self._data_usage.total(
+            period, WAN_DIRECTIONS.index(direction), dt_util.now()
+        )
+
+    def is_home(self, mac):
+        """Return True when the wifi device is considered home."""
+        return self._presence.is_home(mac)
+
+    @property
+    def restored(self):
+        """Return True while the data is from the cache, not a live poll."""
+        return self._restored
+
+    @property
+    def last_diff(self):
+        """Return the changes observed by the last poll."""
+        return self._last_diff
+
+    @property
+    def router_mac_addr(self):
+        """Return the mac address of the router."""
+        return self.data.router_mac if self.data else None
+
+    @property
+    def access_points(self):
+        """Return the wifi clients of each access point."""
+        return self.data.access_points if self.data else {}
 
     @property
     def wifi_devices(self):
         """Return the wifi devices."""
-        return self._wifi_devices
+        return self.data.wifi_devices if self.data else {}
 
     @property
     def ethernet_ports(self):
         """Return the ethernet ports."""
-        return self._ethernet_ports
-    
+        return self.data.ethernet_ports if self.data else {}
+
     @property
     def ethernet_devices(self):
         """Return the ethernet devices."""
-        return self._ethernet_devices
+        return self.data.ethernet_devices if self.data else {}
 
     @property
     def wan_speeds(self):
         """Return the wan speeds."""
-        return self._wan_speeds
+        return self.data.wan_speeds if self.data else {"download": 0, "upload": 0}
@@ -2,17 +2,15 @@
 import re
 import logging
 
-from datetime import datetime
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.components.device_tracker.config_entry import ScannerEntity
 from homeassistant.components.device_tracker import SourceType
 from homeassistant.core import callback
-from .const import DOMAIN, COORDINATOR, COORDINATOR_LISTENER, ENTITIES, CONF_ENABLE_NEW_DEVICES
+from .const import DOMAIN, COORDINATOR, COORDINATOR_LISTENER, ENTITIES, CONF_ENABLE_NEW_DEVICES, LAST_SEEN
 from .coordinator import AmplifiDataUpdateCoordinator
+from .entity import AmplifiEntity
 
 _LOGGER = logging.getLogger(__name__)
-ETHERNET_PORTS = 5
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
@@ -22,62 +20,71 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
         config_entry.entry_id
     ][COORDINATOR]
 
+    # Unique ids of the entities already created, maintained incrementally
+    known_unique_ids = hass.data[DOMAIN][config_entry.entry_id][ENTITIES]
+
     @callback
-    def async_discover_device_tracker():
-        """Discover and add a discovered device_tracker."""
-        for mac_addr in coordinator.wifi_devices:
-            if mac_addr not in hass.data[DOMAIN][config_entry.entry_id][ENTITIES]:
-                async_add_entities(
-                    [
-                        AmplifiWifiDeviceTracker(
-                            coordinator,
-                            mac_addr,
-                            config_entry,
-                        )
-                    ]
-                )
-
-        is_device = False
-        for port in range(0, 5):
-            port_unique_id = f"{DOMAIN}_eth_port_{port}"
-            if port_unique_id not in hass.data[DOMAIN][config_entry.entry_id][ENTITIES]:
-                async_add_entities(
-                    [
+    def async_discover_device_tracker(data_keys=None):
+        """Discover and add all device_trackers found by the last poll at once."""
+        if data_keys is None:
+            data_keys = coordinator.last_diff.added
+
+        new_entities = []
+        for data_key in data_keys:
+            if data_key in coordinator.wifi_devices:
+                unique_id = data_key
+                if unique_id not in known_unique_ids:
+                    new_entities.append(
+                        AmplifiWifiDeviceTracker(coordinator, data_key, config_entry)
+                    )
+            elif data_key in coordinator.ethernet_devices:
+                unique_id = data_key
+                if unique_id not in known_unique_ids:
+                    new_entities.append(
                         AmplifiEthernetDeviceTracker(
-                            coordinator,
-                            port,
-                            config_entry,
-                            is_device,
+                            coordinator, data_key, config_entry, True
                         )
-                    ]
-                )
-
-        is_device = True
-        for mac_addr in coordinator.ethernet_devices:
-            if mac_addr not in hass.data[DOMAIN][config_entry.entry_id][ENTITIES]:
-                async_add_entities(
-                    [
+                    )
+            elif data_key in coordinator.ethernet_ports:
+                port = data_key.split("-", 1)[1]
+                unique_id = f"{DOMAIN}_{config_entry.entry_id}_eth_port_{port}"
+                if unique_id not in known_unique_ids:
+                    new_entities.append(
                         AmplifiEthernetDeviceTracker(
-                            coordinator,
-                            mac_addr,
-                            config_entry,
-                            is_device,
+                            coordinator, port, config_entry, False
                         )
-                    ]
-                )
+                    )
+            else:
+                continue
+            known_unique_ids.add(unique_id)
 
-    @callback
-    def async_unsub_discover_device_tracker():
-        """Stop discovery when config entry is removed."""
-        coordinator.async_remove_listener(async_discover_device_tracker)
+        if new_entities:
+            _LOGGER.debug("Adding %s new device trackers", len(new_entities))
+            async_add_entities(new_entities)
+
+    async_discover_device_tracker(coordinator.data.items() if coordinator.data else ())
+
+    config_entry.async_on_unload(
+        coordinator.async_add_listener(async_discover_device_tracker)
+    )
 
-    async_discover_device_tracker()
 
-    coordinator.async_add_listener(async_discover_device_tracker)
-    config_entry.async_on_unload(async_unsub_discover_device_tracker)
+def _device_attributes(coordinator, data, last_seen):
+    """Return the state attributes for the data of a device or port.
 
+    last_seen is the time of the last poll that saw the device, it changes
+    with every poll unless it is excluded.
+    """
+    excluded = coordinator.excluded_attributes
+    attributes = {key: value for key, value in data.items() if key not in excluded}
+    if last_seen is not None and LAST_SEEN not in excluded:
+        attributes[LAST_SEEN] = last_seen.isoformat()
+    if coordinator.restored:
+        attributes["restored"] = True
+    return attributes
 
-class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
+
+class AmplifiWifiDeviceTracker(AmplifiEntity, ScannerEntity):
     """Representing a wireless device connected to amplifi."""
 
     _name = None
@@ -90,21 +97,23 @@ class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
         self, coordinator: AmplifiDataUpdateCoordinator, mac_addr, config_entry
     ):
         """Initialize amplifi wireless device tracker."""
-        super().__init__(coordinator)
+        super().__init__(coordinator, mac_addr)
         self.unique_id = mac_addr
         self._data = coordinator.wifi_devices[mac_addr]
         self.config_entry = config_entry
-        self._connected = True
-
-        if self._data is not None and "Description" in self._data:
-            self._name = f"{DOMAIN}_{self._data['Description']}"
-            self._description = self._data['Description']
-        elif self._data is not None and "HostName" in self._data:
-            self._name = f"{DOMAIN}_{self._data['HostName']}"
-            self._description = self._data['HostName']
-        elif self._data is not None and "Address" in self._data:
-            self._name = f"{DOMAIN}_{self._data['Address']}"
-            self._description = self._data['Address']
+        self._present = True
+        self._connected = coordinator.is_home(mac_addr)
+        self._last_seen = coordinator.seen_time
+
+        if self._data is not None and self._data.description is not None:
+            self._name = f"{DOMAIN}_{self._data.description}"
+            self._description = self._data.description
+        elif self._data is not None and self._data.hostname is not None:
+            self._name = f"{DOMAIN}_{self._data.hostname}"
+            self._description = self._data.hostname
+        elif self._data is not None and self._data.ip is not None:
+            self._name = f"{DOMAIN}_{self._data.ip}"
+            self._description = self._data.ip
         else:
             self._name = f"{DOMAIN}_{self.unique_id}"
             self._description = self.unique_id.upper()
@@ -138,10 +147,7 @@ class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
     @property
     def ip_address(self):
         """Return the primary ip address of the device."""
-        if "Address" in self._data:
-            return self._data["Address"]
-
-        return None
+        return self._data.ip
 
     @property
     def mac_address(self):
@@ -151,25 +157,20 @@ class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
     @property
     def hostname(self):
         """Return hostname of the device."""
-        if "HostName" in self._data:
-            return self._data["HostName"]
-
-        return None
+        return self._data.hostname
 
     @property
     def connected_to(self):
         """Return mac address of the AP this device is connected to."""
-        if "connected_to" in self._data:
-            return self._data["connected_to"]
-
-        return None
-
-    @property
-    def extra_state_attributes(self):
-        """Return extra attributes."""
-        if self.coordinator.last_update_success and self._data is not None:
-            return {**self._data, "last_seen": datetime.now().isoformat()}
-        return {}
+        return self._data.access_point
+
+    def _build_attributes(self):
+        """Return the attributes of the device, without excluded ones."""
+        if self._data is None:
+            return {}
+        return _device_attributes(
+            self.coordinator, self._data.as_attributes(), self._last_seen
+        )
 
     @property
     def entity_registry_enabled_default(self) -> bool:
@@ -179,29 +180,18 @@ class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
         
         return False
 
-    def update(self):
-        _LOGGER.debug(f"entity={self.unique_id} update() was called")
-        self._handle_coordinator_update()
-
-    async def async_added_to_hass(self):
-        """Run when this Entity has been added to HA."""
-        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities[self.unique_id] = self.unique_id
-        await super().async_added_to_hass()
-
-    async def async_will_remove_from_hass(self):
-        """Entity being removed from hass."""
-        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities.pop(self.unique_id)
-        await super().async_will_remove_from_hass()
-
     @callback
     def _handle_coordinator_update(self):
-        self._connected = False
-
-        if self.unique_id in self.coordinator.wifi_devices:
+        present = self.unique_id in self.coordinator.wifi_devices
+        if present:
             self._data = self.coordinator.wifi_devices[self.unique_id]
-            self._connected = True
+            self._last_seen = self.coordinator.seen_time
+        elif self._present:
+            # Still there on the poll before this one
+            self._last_seen = self.coordinator.previous_seen_time
+        self._present = present
+        # Joining and leaving is debounced by the coordinator
+        self._connected = self.coordinator.is_home(self.unique_id)
 
         _LOGGER.debug(
             f"entity={self.unique_id} was updated via _handle_coordinator_update"
@@ -210,7 +200,7 @@ class AmplifiWifiDeviceTracker(CoordinatorEntity, ScannerEntity):
         super()._handle_coordinator_update()
 
 
-class AmplifiEthernetDeviceTracker(CoordinatorEntity, ScannerEntity):
+class AmplifiEthernetDeviceTracker(AmplifiEntity, ScannerEntity):
     """Representing an ethernet port of amplifi."""
 
     _name = None
@@ -224,10 +214,10 @@ class AmplifiEthernetDeviceTracker(CoordinatorEntity, ScannerEntity):
 
     def __init__(self, coordinator: AmplifiDataUpdateCoordinator, identifier, config_entry, is_device):
         """Initialize amplifi ethernet device tracker."""
-        super().__init__(coordinator)
+        data_key = identifier if is_device else f"eth-{identifier}"
+        super().__init__(coordinator, data_key)
         if is_device:
             self._mac_addr = identifier
-            self._data_key = self._mac_addr
             self.unique_id = self._mac_addr
             self._data = coordinator.ethernet_devices[f"{self._data_key}"]
             self.config_entry = config_entry
@@ -236,29 +226,29 @@ class AmplifiEthernetDeviceTracker(CoordinatorEntity, ScannerEntity):
             if self._mac_addr in coordinator.ethernet_devices:
                 self._device_info = coordinator.ethernet_devices[self._mac_addr]
 
-            if self._device_info is not None and "description" in self._device_info:
-                self._name = f"{DOMAIN}_{self._data['description']}"
-                self._description = self._device_info['description']
-            elif self._device_info is not None and "host_name" in self._device_info:
-                self._name = f"{DOMAIN}_{self._data['host_name']}"
-                self._description = self._device_info['host_name']
-            elif self._device_info is not None and "ip" in self._device_info:
-                self._name = f"{DOMAIN}_{self._data['ip']}"
-                self._description = self._device_info['ip']
+            if self._device_info is not None and self._device_info.description is not None:
+                self._name = f"{DOMAIN}_{self._data.description}"
+                self._description = self._device_info.description
+            elif self._device_info is not None and self._device_info.hostname is not None:
+                self._name = f"{DOMAIN}_{self._data.hostname}"
+                self._description = self._device_info.hostname
+            elif self._device_info is not None and self._device_info.ip is not None:
+                self._name = f"{DOMAIN}_{self._data.ip}"
+                self._description = self._device_info.ip
             else:
                 self._name = f"{DOMAIN}_{self._mac_addr}"
                 self._description = self._mac_addr
 
         else:
             self._port = identifier
-            self._data_key = f"eth-{self._port}"
-            self.unique_id = f"{DOMAIN}_eth_port_{self._port}"
+            self.unique_id = f"{DOMAIN}_{config_entry.entry_id}_eth_port_{self._port}"
             self._data = coordinator.ethernet_ports[f"{self._data_key}"]
             self.config_entry = config_entry
             self._description = f"Ethernet Port {self._port}"
-            self._name = self.unique_id
+            self._name = f"{DOMAIN}_eth_port_{self._port}"
 
         self._is_device = is_device
+        self._last_seen = coordinator.seen_time
 
         # Override the entity_id so we can provide a better friendly name
         self.entity_id = f'device_tracker.{self._name}'
@@ -297,12 +287,12 @@ class AmplifiEthernetDeviceTracker(CoordinatorEntity, ScannerEntity):
         if self._is_device:
             return self.unique_id
 
-    @property
-    def extra_state_attributes(self):
-        """Return extra attributes."""
-        if self.coordinator.last_update_success and self._data is not None:
-            return {**self._data, "last_seen": datetime.now().isoformat()}
-        return {}
+    def _build_attributes(self):
+        """Return the attributes of the device or port, without excluded ones."""
+        if self._data is None:
+            return {}
+        data = self._data.as_attributes() if self._is_device else self._data
+        return _device_attributes(self.coordinator, data, self._last_seen)
 
     @property
     def entity_registry_enabled_default(self) -> bool:
@@ -315,28 +305,14 @@ class AmplifiEthernetDeviceTracker(CoordinatorEntity, ScannerEntity):
         else:
             return True
 
-    def update(self):
-        _LOGGER.debug(f"entity={self.unique_id} update() was called")
-        self._handle_coordinator_update()
-
-    async def async_added_to_hass(self):
-        """Run when this Entity has been added to HA."""
-        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities[self.unique_id] = self.unique_id
-        await super().async_added_to_hass()
-
-    async def async_will_remove_from_hass(self):
-        """Entity being removed from hass."""
-        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities.pop(self.unique_id)
-        await super().async_will_remove_from_hass()
-
     @callback
     def _handle_coordinator_update(self):
         if not self._is_device and self._data_key in self.coordinator.ethernet_ports:
             self._data = self.coordinator.ethernet_ports[self._data_key]
+            self._last_seen = self.coordinator.seen_time
         elif self._is_device and self._data_key in self.coordinator.ethernet_devices:
             self._data = self.coordinator.ethernet_devices[self._data_key]
+            self._last_seen = self.coordinator.seen_time
 
         _LOGGER.debug(
             f"entity={self.unique_id} was updated via _handle_coordinator_update"
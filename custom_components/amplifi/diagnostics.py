@@ -0,0 +1,42 @@
+"""Diagnostics support for the Amplifi integration."""
+import time
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD
+from homeassistant.core import HomeAssistant
+
+from .const import COORDINATOR, DOMAIN
+
+TO_REDACT = {CONF_PASSWORD, "login_token", "info_token", "cookie"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+
+    return async_redact_data(
+        {
+            "entry": {
+                "data": dict(entry.data),
+                "options": dict(entry.options),
+            },
+            "coordinator": {
+                "last_update_success": coordinator.last_update_success,
+                "update_interval": str(coordinator.update_interval),
+                "restored": coordinator.restored,
+                "access_points": len(coordinator.access_points),
+                "wifi_devices": len(coordinator.wifi_devices),
+                "ethernet_devices": len(coordinator.ethernet_devices),
+                "health": coordinator.health.as_dict(),
+                "breaker": coordinator.breaker.as_dict(time.monotonic()),
+            },
+            "poll_stats": {
+                **coordinator.poll_stats.as_dict(),
+                "counters": coordinator.poll_counters,
+            },
+        },
+        TO_REDACT,
+    )
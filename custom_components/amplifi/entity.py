@@ -0,0 +1,63 @@
+"""Base entity for the Amplifi integration."""
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity
+
+from .const import DOMAIN, ENTITIES
+from .coordinator import AmplifiDataUpdateCoordinator
+
+
+class AmplifiEntity(Entity):
+    """Entity that is only updated when its own MAC address or port changes."""
+
+    _attr_should_poll = False
+    # Availability, state and attributes of the last state written
+    _written_state = None
+
+    def __init__(self, coordinator: AmplifiDataUpdateCoordinator, data_key):
+        """Initialize the entity."""
+        self.coordinator = coordinator
+        self._data_key = data_key
+
+    @property
+    def available(self):
+        """Return if the last update of the coordinator was successful."""
+        return self.coordinator.last_update_success
+
+    def _build_attributes(self):
+        """Return the extra state attributes for the current data."""
+        return None
+
+    async def async_added_to_hass(self):
+        """Run when this Entity has been added to HA."""
+        await super().async_added_to_hass()
+        attributes = self._build_attributes()
+        self._written_state = (self.available, self.state, attributes)
+        self._attr_extra_state_attributes = attributes
+        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
+        entities.add(self.unique_id)
+        self.async_on_remove(
+            self.coordinator.async_subscribe(
+                self._data_key, self._handle_coordinator_update
+            )
+        )
+
+    async def async_will_remove_from_hass(self):
+        """Entity being removed from hass."""
+        entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
+        entities.discard(self.unique_id)
+        await super().async_will_remove_from_hass()
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Handle an update of the item this entity subscribed to.
+
+        Attributes are built once per update and the state is only written
+        when something visible changed, e.g. not for excluded attributes.
+        """
+        attributes = self._build_attributes()
+        written_state = (self.available, self.state, attributes)
+        if written_state == self._written_state:
+            return
+        self._written_state = written_state
+        self._attr_extra_state_attributes = attributes
+        self.async_write_ha_state()
@@ -0,0 +1,31 @@
+"""Payloads of the device events fired by the Amplifi integration."""
+
+
+def device_summary(device):
+    """Return the compact description of a wifi device used in events."""
+    return {
+        "mac": device.mac,
+        "ip": device.ip,
+        "hostname": device.hostname,
+        "description": device.description,
+        "access_point": device.access_point,
+        "band": device.band,
+    }
+
+
+def roam_summary(previous, current):
+    """Return the description of a device that moved, None if it did not."""
+    if (previous.access_point, previous.band) == (
+        current.access_point,
+        current.band,
+    ):
+        return None
+    return {
+        "mac": current.mac,
+        "hostname": current.hostname,
+        "description": current.description,
+        "from_access_point": previous.access_point,
+        "to_access_point": current.access_point,
+        "from_band": previous.band,
+        "to_band": current.band,
+    }
@@ -0,0 +1,131 @@
+"""Poll interval scheduling for the Amplifi coordinator."""
+from datetime import timedelta
+
+from .const import (
+    ADAPTIVE_FAST_POLLS,
+    ADAPTIVE_QUIET_FACTOR,
+    ADAPTIVE_QUIET_POLLS,
+    BACKOFF_MAX_INTERVAL,
+    MIN_POLL_SPACING,
+    MIN_SCAN_INTERVAL,
+    TIER_INVENTORY,
+    TIER_PRESENCE,
+    TIER_WAN,
+)
+
+# Lightest first
+TIERS = (TIER_WAN, TIER_PRESENCE, TIER_INVENTORY)
+
+
+def tier_covers(tier, other):
+    """Return True if a poll of tier also refreshes the other tier."""
+    return tier is not None and TIERS.index(tier) >= TIERS.index(other)
+
+
+class AdaptivePollInterval:
+    """Work out how long to wait before the next poll.
+
+    With adaptive polling disabled the configured interval is always used.
+    Otherwise the interval is halved for a few polls after a change was seen,
+    grows while the network is quiet and backs off exponentially while the
+    router cannot be reached.
+    """
+
+    def __init__(self, interval, adaptive=False):
+        """Initialize with the configured interval in seconds."""
+        self.interval = interval
+        self.adaptive = adaptive
+        self.fast_polls_left = 0
+        self.quiet_polls = 0
+        self.failures = 0
+        self.current = interval
+
+    @property
+    def fast_interval(self):
+        """Return the interval used right after a change."""
+        return max(MIN_SCAN_INTERVAL, self.interval / 2)
+
+    @property
+    def quiet_interval(self):
+        """Return the longest interval used while nothing changes."""
+        return self.interval * ADAPTIVE_QUIET_FACTOR
+
+    def success(self, changed):
+        """Return the next interval after a successful poll."""
+        self.failures = 0
+        if not self.adaptive:
+            return self._set(self.interval)
+
+        if changed:
+            self.quiet_polls = 0
+            self.fast_polls_left = ADAPTIVE_FAST_POLLS
+            return self._set(self.fast_interval)
+
+        self.quiet_polls += 1
+        if self.fast_polls_left:
+            self.fast_polls_left -= 1
+            return self._set(self.fast_interval)
+        if self.quiet_polls < ADAPTIVE_QUIET_POLLS:
+            return self._set(self.interval)
+
+        # Double for every further run of quiet polls up to the quiet interval
+        steps = self.quiet_polls // ADAPTIVE_QUIET_POLLS
+        return self._set(min(self.interval * 2**steps, self.quiet_interval))
+
+    def failure(self):
+        """Return the next interval after a failed poll."""
+        self.failures += 1
+        self.fast_polls_left = self.quiet_polls = 0
+        if not self.adaptive:
+            return self._set(self.interval)
+
+        backoff = self.interval * 2 ** min(self.failures, 16)
+        return self._set(min(backoff, max(BACKOFF_MAX_INTERVAL, self.interval)))
+
+    def _set(self, seconds):
+        self.current = seconds
+        return timedelta(seconds=seconds)
+
+
+class PollTiers:
+    """Track when each tier of data is next due.
+
+    Tiers are ordered from the lightest to the heaviest request and a heavier
+    request also refreshes every lighter tier. A tier without an interval is
+    never scheduled on its own.
+    """
+
+    def __init__(self, intervals):
+        """Initialize with a tier -> interval in seconds (or None) mapping."""
+        self.intervals = dict(intervals)
+        self.next_due = {tier: 0 for tier in TIERS}
+
+    def due(self, now):
+        """Return the heaviest tier that is due, the presence tier if none is."""
+        due_tiers = [
+            tier
+            for tier in TIERS
+            if self.intervals.get(tier) and self.next_due[tier] <= now + 0.5
+        ]
+        return due_tiers[-1] if due_tiers else TIER_PRESENCE
+
+    def completed(self, tier, now):
+        """Mark the tier, and every lighter tier, as refreshed at now."""
+        for lighter_tier in TIERS[: TIERS.index(tier) + 1]:
+            interval = self.intervals.get(lighter_tier)
+            if interval:
+                self.next_due[lighter_tier] = now + interval
+
+    def set_interval(self, tier, seconds, now):
+        """Change the interval of a tier, None stops scheduling it."""
+        self.intervals[tier] = seconds
+        if seconds:
+            # A shorter interval pulls the next poll of the tier forward
+            self.next_due[tier] = min(self.next_due[tier], now + seconds)
+
+    def next_delay(self, now):
+        """Return the seconds until the next tier is due."""
+        due_times = [
+            self.next_due[tier] for tier in TIERS if self.intervals.get(tier)
+        ]
+        return max(min(due_times) - now, MIN_POLL_SPACING)
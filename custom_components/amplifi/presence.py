@@ -0,0 +1,104 @@
+"""Presence hysteresis for the wifi devices of the Amplifi router."""
+import heapq
+
+AWAY = "away"
+JOINING = "joining"
+HOME = "home"
+LEAVING = "leaving"
+
+
+class PresenceTracker:
+    """Debounce devices joining and leaving the network.
+
+    A device that appears is only home once it stayed for min_online seconds
+    and a home device that disappears is only away once it stayed away for
+    consider_home seconds. Pending transitions are kept in a heap of
+    (deadline, generation, mac) entries, entries outdated by a later
+    observation are skipped when they are popped rather than removed.
+    """
+
+    def __init__(self, consider_home=0, min_online=0):
+        """Initialize with the grace periods in seconds."""
+        self.consider_home = consider_home
+        self.min_online = min_online
+        # MAC address -> (state, generation)
+        self._devices = {}
+        self._deadlines = []
+        self._generation = 0
+
+    def is_home(self, mac):
+        """Return True when the device is considered home."""
+        state = self._devices.get(mac, (AWAY,))[0]
+        return state in (HOME, LEAVING)
+
+    def state(self, mac):
+        """Return the state of the device."""
+        return self._devices.get(mac, (AWAY,))[0]
+
+    def observe(self, joined, left, now, initial=False):
+        """Apply the devices that appeared and disappeared in a poll.
+
+        Devices of the first snapshot are home right away. Return the MAC
+        addresses whose presence changed.
+        """
+        changed = set()
+        for mac in joined:
+            state = self.state(mac)
+            if state == LEAVING:
+                # Back before consider_home ran out, the device never left
+                self._set(mac, HOME)
+            elif state == AWAY:
+                if initial or not self.min_online:
+                    self._set(mac, HOME)
+                    changed.add(mac)
+                else:
+                    self._set(mac, JOINING, now + self.min_online)
+
+        for mac in left:
+            state = self.state(mac)
+            if state == HOME:
+                if self.consider_home:
+                    self._set(mac, LEAVING, now + self.consider_home)
+                else:
+                    self._set(mac, AWAY)
+                    changed.add(mac)
+            elif state == JOINING:
+                # Left before it was online long enough to be home
+                self._set(mac, AWAY)
+        return changed
+
+    def expire(self, now):
+        """Complete every transition that is due, return the changed MACs."""
+        changed = set()
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            _, generation, mac = heapq.heappop(deadlines)
+            state, current_generation = self._devices.get(mac, (AWAY, None))
+            if generation != current_generation:
+                continue
+            if state == JOINING:
+                self._set(mac, HOME)
+                changed.add(mac)
+            elif state == LEAVING:
+                self._set(mac, AWAY)
+                changed.add(mac)
+        return changed
+
+    def next_deadline(self):
+        """Return when the next transition is due, None when none is pending."""
+        deadlines = self._deadlines
+        while deadlines:
+            deadline, generation, mac = deadlines[0]
+            if self._devices.get(mac, (AWAY, None))[1] == generation:
+                return deadline
+            heapq.heappop(deadlines)
+        return None
+
+    def _set(self, mac, state, deadline=None):
+        if state == AWAY:
+            self._devices.pop(mac, None)
+            return
+        self._generation += 1
+        self._devices[mac] = (state, self._generation)
+        if deadline is not None:
+            heapq.heappush(self._deadlines, (deadline, self._generation, mac))
@@ -0,0 +1,129 @@
+"""Recording of the raw info-async.php responses of the router.
+
+Recordings are gzip compressed JSON lines, one response per line:
+
+    {"time": 1700000000.1, "elapsed": 0.143, "mode": "full", "payload": [...]}
+
+A response that is not valid JSON is kept as text in "body" instead of
+"payload". A recording that reached its maximum size is rotated to the same
+path with ".1" appended, replacing the previous one. tools/replay.py feeds a
+recording back into the integration.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+
+MAC_PATTERN = r"[0-9A-Fa-f]{2}(?::[0-9A-Fa-f]{2}){5}"
+IPV4_PATTERN = r"(?:\d{1,3}\.){3}\d{1,3}"
+MAC_RE = re.compile(MAC_PATTERN)
+IPV4_RE = re.compile(IPV4_PATTERN)
+IDENTIFIER_RE = re.compile(rf"(?<![\w:.])(?:{MAC_PATTERN}|{IPV4_PATTERN})(?![\w:.])")
+# Compressed bytes of a recording before it is rotated, so at most twice this
+# is kept on disk
+MAX_RECORDING_BYTES = 50 * 1024 * 1024
+# Pseudonyms cached before the cache is cleared, they are derived again from
+# the secret so clearing it does not change them
+MAX_PSEUDONYMS = 10000
+
+
+def read_recording(path):
+    """Yield the responses of a recording in the order they were recorded."""
+    with gzip.open(path, "rt", encoding="utf-8") as recording:
+        for line in recording:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PayloadRecorder:
+    """Append the responses of the router to a recording.
+
+    With hash_identifiers every MAC and IPv4 address, also when used as a
+    key, is replaced by a pseudonym of the same shape: a locally
+    administered MAC address or an address in 10.0.0.0/8. Pseudonyms are
+    keyed with a random secret that is not written to the recording, so the
+    same device keeps its pseudonym across responses, and across restarts
+    when the caller keeps the secret, and the recording still parses like
+    the real payload.
+    """
+
+    def __init__(
+        self, path, hash_identifiers=True, secret=None, max_bytes=MAX_RECORDING_BYTES
+    ):
+        """Initialize with the file to append to and the pseudonym key.
+
+        secret is random bytes, a new one is generated when it is None. The
+        file is rotated once it holds max_bytes or more.
+        """
+        self.path = path
+        self.hash_identifiers = hash_identifiers
+        self.max_bytes = max_bytes
+        self._pseudonyms = {}
+        self.secret = secret
+
+    @property
+    def secret(self):
+        """Return the key of the pseudonyms."""
+        return self._key
+
+    @secret.setter
+    def secret(self, secret):
+        self._key = secret if secret is not None else secrets.token_bytes(32)
+        self._pseudonyms = {}
+
+    def record(self, mode, body, elapsed):
+        """Append a response body, blocking so run it in an executor."""
+        line = {"time": time.time(), "elapsed": round(elapsed, 6), "mode": mode}
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            text = body.decode(errors="replace")
+            if self.hash_identifiers:
+                text = IDENTIFIER_RE.sub(lambda match: self._pseudonym(match[0]), text)
+            line["body"] = text
+        else:
+            line["payload"] = (
+                self._anonymise(payload) if self.hash_identifiers else payload
+            )
+
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        with gzip.open(self.path, "at", encoding="utf-8") as recording:
+            recording.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def _anonymise(self, value):
+        if isinstance(value, dict):
+            return {
+                self._anonymise(key): self._anonymise(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self._anonymise(item) for item in value]
+        if isinstance(value, str) and (
+            MAC_RE.fullmatch(value) or IPV4_RE.fullmatch(value)
+        ):
+            return self._pseudonym(value)
+        return value
+
+    def _pseudonym(self, value):
+        pseudonym = self._pseudonyms.get(value)
+        if pseudonym is None:
+            is_mac = MAC_RE.fullmatch(value) is not None
+            digest = hmac.new(
+                self._key, value.lower().encode(), hashlib.sha256
+            ).digest()
+            if is_mac:
+                pseudonym = "02:" + ":".join(f"{byte:02x}" for byte in digest[:5])
+            else:
+                pseudonym = "10." + ".".join(str(byte) for byte in digest[:3])
+            if len(self._pseudonyms) >= MAX_PSEUDONYMS:
+                self._pseudonyms.clear()
+            self._pseudonyms[value] = pseudonym
+        return pseudonym
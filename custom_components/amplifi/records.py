@@ -0,0 +1,153 @@
+"""Compact records of the devices reported by the router.
+
+Records are named tuples, they have no instance dict, compare in C when the
+snapshots are diffed and are immutable like the snapshot holding them. Only
+the fields the integration uses are kept, the dict of the device in the
+payload is only kept in raw when the full attribute set was asked for.
+"""
+from types import MappingProxyType
+from typing import NamedTuple
+
+# Record field -> key of the device in the info-async.php payload
+WIFI_DEVICE_FIELDS = {
+    "ip": "Address",
+    "hostname": "HostName",
+    "description": "Description",
+    "signal_quality": "SignalQuality",
+    "rx_bitrate": "RxBitrate",
+    "tx_bitrate": "TxBitrate",
+    "rx_bytes": "RxBytes",
+    "tx_bytes": "TxBytes",
+}
+ETHERNET_DEVICE_FIELDS = {
+    "ip": "ip",
+    "hostname": "host_name",
+    "description": "description",
+}
+
+_new = tuple.__new__
+
+
+def _attributes(record, fields):
+    """Return the attributes of a record, named like the keys of the payload."""
+    if record.raw is not None:
+        return dict(record.raw)
+    return {
+        key: getattr(record, name)
+        for name, key in fields.items()
+        if getattr(record, name) is not None
+    }
+
+
+def _as_dict(record):
+    data = record._asdict()
+    if record.raw is not None:
+        data["raw"] = dict(record.raw)
+    return data
+
+
+def _freeze_raw(data):
+    data = dict(data)
+    if data.get("raw") is not None:
+        data["raw"] = MappingProxyType(data["raw"])
+    return data
+
+
+class WifiDevice(NamedTuple):
+    """A wifi client and the access point and band it is connected to."""
+
+    mac: str
+    ip: str = None
+    hostname: str = None
+    description: str = None
+    access_point: str = None
+    band: str = None
+    signal_quality: int = None
+    rx_bitrate: int = None
+    tx_bitrate: int = None
+    rx_bytes: int = None
+    tx_bytes: int = None
+    raw: MappingProxyType = None
+
+    @classmethod
+    def from_raw(cls, mac, info, access_point, band, keep_raw=False):
+        """Create a record from the dict of the device in the payload."""
+        get = info.get
+        # Built without the generated __new__, this runs for every client
+        return _new(
+            cls,
+            (
+                mac,
+                get("Address"),
+                get("HostName"),
+                get("Description"),
+                access_point,
+                band,
+                get("SignalQuality"),
+                get("RxBitrate"),
+                get("TxBitrate"),
+                get("RxBytes"),
+                get("TxBytes"),
+                MappingProxyType(info) if keep_raw else None,
+            ),
+        )
+
+    def as_attributes(self):
+        """Return the state attributes of the device."""
+        return {
+            **_attributes(self, WIFI_DEVICE_FIELDS),
+            "connected_to": self.access_point,
+            "band": self.band,
+        }
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the record."""
+        return _as_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a record from the output of as_dict."""
+        return cls(**_freeze_raw(data))
+
+
+class EthernetDevice(NamedTuple):
+    """A device connected to an ethernet port of the router."""
+
+    mac: str
+    ip: str = None
+    hostname: str = None
+    description: str = None
+    port: str = None
+    raw: MappingProxyType = None
+
+    @classmethod
+    def from_raw(cls, mac, info, port, keep_raw=False):
+        """Create a record from the device info in the payload."""
+        get = info.get
+        return _new(
+            cls,
+            (
+                mac,
+                get("ip"),
+                get("host_name"),
+                get("description"),
+                port,
+                MappingProxyType(info) if keep_raw else None,
+            ),
+        )
+
+    def as_attributes(self):
+        """Return the state attributes of the device."""
+        return {
+            **_attributes(self, ETHERNET_DEVICE_FIELDS),
+            "connected_to_port": self.port,
+        }
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the record."""
+        return _as_dict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a record from the output of as_dict."""
+        return cls(**_freeze_raw(data))
@@ -0,0 +1,114 @@
+"""Scheduler shared by the coordinators of every configured router."""
+import asyncio
+
+from contextlib import asynccontextmanager
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import MAX_CONCURRENT_POLLS, POLL_STAGGER
+
+
+class RouterHealth:
+    """Outcome of the last polls of a router."""
+
+    __slots__ = ("failures", "last_success", "last_error")
+
+    def __init__(self):
+        # Consecutive failed polls
+        self.failures = 0
+        self.last_success = None
+        self.last_error = None
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the health."""
+        return {
+            "failures": self.failures,
+            "last_success": (
+                self.last_success.isoformat() if self.last_success else None
+            ),
+            "last_error": self.last_error,
+        }
+
+
+class AmplifiScheduler:
+    """Stagger the polls of every router and limit how many run at once.
+
+    Every coordinator keeps its own interval and is polled concurrently with
+    the others, the scheduler only moves each poll so it does not start
+    within POLL_STAGGER seconds of the poll of another router and hands out
+    the slots of the global concurrency limit. Routers whose last poll
+    failed never hold the last free slot, so a router that is down and waits
+    for its timeout cannot hold back the polls of the others.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, limit=MAX_CONCURRENT_POLLS, spacing=POLL_STAGGER
+    ):
+        """Initialize the scheduler."""
+        self._hass = hass
+        self._spacing = spacing
+        self._slots = asyncio.Semaphore(limit)
+        self._failing_slots = asyncio.Semaphore(max(limit - 1, 1))
+        # Entry id -> RouterHealth
+        self.health = {}
+        # Entry id -> loop time of its next poll
+        self._next_poll = {}
+
+    @callback
+    def async_add_router(self, entry_id):
+        """Start tracking a router, return a callback that stops tracking it."""
+        self.health[entry_id] = RouterHealth()
+
+        @callback
+        def remove_router():
+            self.health.pop(entry_id, None)
+            self._next_poll.pop(entry_id, None)
+
+        return remove_router
+
+    @callback
+    def async_schedule(self, entry_id, delay, job):
+        """Run the poll job of a router in delay seconds, staggered.
+
+        Return a callback cancelling the poll.
+        """
+        loop = self._hass.loop
+        now = loop.time()
+        when = now + delay
+        for other in sorted(
+            when_other
+            for other_entry_id, when_other in self._next_poll.items()
+            if other_entry_id != entry_id and when_other > now
+        ):
+            if abs(other - when) < self._spacing:
+                when = other + self._spacing
+        self._next_poll[entry_id] = when
+        return loop.call_at(when, self._hass.async_run_hass_job, job).cancel
+
+    @asynccontextmanager
+    async def slot(self, entry_id):
+        """Wait for a free slot to poll the router."""
+        health = self.health.get(entry_id)
+        if health is not None and health.failures:
+            async with self._failing_slots, self._slots:
+                yield
+        else:
+            async with self._slots:
+                yield
+
+    @callback
+    def async_poll_succeeded(self, entry_id):
+        """Record a successful poll of a router."""
+        health = self.health.get(entry_id)
+        if health is not None:
+            health.failures = 0
+            health.last_success = dt_util.utcnow()
+
+    @callback
+    def async_poll_failed(self, entry_id, error):
+        """Record a failed poll of a router."""
+        health = self.health.get(entry_id)
+        if health is not None:
+            health.failures += 1
+            health.last_error = error
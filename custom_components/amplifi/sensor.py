@@ -9,12 +9,72 @@ import logging
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import callback
-from homeassistant.const import UnitOfDataRate
+from homeassistant.util import slugify
+from homeassistant.const import (
+    EntityCategory,
+    UnitOfDataRate,
+    UnitOfInformation,
+    UnitOfTime,
+)
 
-from .const import DOMAIN, COORDINATOR, COORDINATOR_LISTENER, ENTITIES
+from .const import (
+    DOMAIN,
+    BREAKER_KEY,
+    BREAKER_STATES,
+    CLIENT_RATE_KEY,
+    CONF_ENABLE_NEW_DEVICES,
+    COORDINATOR,
+    COORDINATOR_LISTENER,
+    DATA_USAGE_KEY,
+    MESH_POINT_KEY,
+    ENTITIES,
+    POLL_STATS_KEY,
+    WAN_DIRECTIONS,
+    WAN_STATISTICS_KEY,
+)
+from .entity import AmplifiEntity
+from .stats import (
+    COUNTER_FAILURES,
+    COUNTER_REAUTH,
+    METRIC_DEVICES,
+    METRIC_LOOP_BLOCKED,
+    METRIC_PAYLOAD_BYTES,
+    STAGES,
+)
+from .usage import PERIODS
 
 _LOGGER = logging.getLogger(__name__)
 WAN_SPEED_SENSOR_TYPES = ["download", "upload"]
+# Metric -> (device class, unit) of the poll statistics sensors
+POLL_STAT_SENSOR_TYPES = {
+    **{
+        stage: (SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS)
+        for stage in (*STAGES, METRIC_LOOP_BLOCKED)
+    },
+    METRIC_PAYLOAD_BYTES: (SensorDeviceClass.DATA_SIZE, UnitOfInformation.BYTES),
+    METRIC_DEVICES: (None, None),
+}
+POLL_COUNTER_SENSOR_TYPES = [COUNTER_REAUTH, COUNTER_FAILURES]
+WAN_STATISTIC_SENSOR_TYPES = ["mean", "p95", "peak"]
+# Sensor type -> (name, device class, unit, icon) of the sensors of each mesh
+# point, there is also a client count sensor for every band
+MESH_POINT_SENSOR_TYPES = {
+    "clients": ("Clients", None, None, "mdi:account-multiple"),
+    "clients_rx_rate": (
+        "Clients RX Rate",
+        SensorDeviceClass.DATA_RATE,
+        UnitOfDataRate.MEGABITS_PER_SECOND,
+        "mdi:download-network",
+    ),
+    "clients_tx_rate": (
+        "Clients TX Rate",
+        SensorDeviceClass.DATA_RATE,
+        UnitOfDataRate.MEGABITS_PER_SECOND,
+        "mdi:upload-network",
+    ),
+}
+# Index of each direction in the rates of the coordinator
+CLIENT_RATE_SENSOR_TYPES = {"rx": 0, "tx": 1}
 sensordeviceclass = SensorDeviceClass.DATA_RATE
 sensorstateclass = SensorStateClass.MEASUREMENT
 
@@ -25,7 +85,9 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     """Add internet speed sensors."""
     for speed_sensor_type in WAN_SPEED_SENSOR_TYPES:
-        wan_sensor_unique_id = f"{DOMAIN}_wan_{speed_sensor_type}_speed"
+        wan_sensor_unique_id = (
+            f"{DOMAIN}_{config_entry.entry_id}_wan_{speed_sensor_type}_speed"
+        )
         if (
             wan_sensor_unique_id
             not in hass.data[DOMAIN][config_entry.entry_id][ENTITIES]
@@ -38,6 +100,101 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
                 ]
             )
 
+    """Add the disabled by default poll statistics sensors."""
+    async_add_entities(
+        [
+            AmplifiPollStatSensor(coordinator, config_entry, metric)
+            for metric in POLL_STAT_SENSOR_TYPES
+        ]
+        + [
+            AmplifiPollCounterSensor(coordinator, config_entry, counter)
+            for counter in POLL_COUNTER_SENSOR_TYPES
+        ]
+        + [AmplifiBreakerSensor(coordinator, config_entry)]
+    )
+
+    """Add the rolling WAN statistics sensors of the configured windows."""
+    async_add_entities(
+        [
+            AmplifiWanStatisticSensor(
+                coordinator, config_entry, direction, statistic, seconds
+            )
+            for seconds in coordinator.wan_statistics_windows
+            for direction in WAN_DIRECTIONS
+            for statistic in WAN_STATISTIC_SENSOR_TYPES
+        ]
+    )
+
+    """Add the daily and monthly WAN data usage sensors."""
+    async_add_entities(
+        [
+            AmplifiDataUsageSensor(coordinator, config_entry, direction, period)
+            for period in PERIODS
+            for direction in WAN_DIRECTIONS
+        ]
+    )
+
+    known_unique_ids = hass.data[DOMAIN][config_entry.entry_id][ENTITIES]
+
+    @callback
+    def async_discover_mesh_point_sensors():
+        """Add the sensors of new mesh points and of bands seen on them."""
+        new_entities = []
+        for mac in coordinator.mesh_points:
+            stats = coordinator.mesh_point_stats(mac)
+            bands = [band for band in stats.bands if band] if stats else []
+            for sensor_type in (*MESH_POINT_SENSOR_TYPES, *bands):
+                band = None if sensor_type in MESH_POINT_SENSOR_TYPES else sensor_type
+                unique_id = _mesh_point_unique_id(mac, sensor_type, band)
+                if unique_id not in known_unique_ids:
+                    known_unique_ids.add(unique_id)
+                    new_entities.append(
+                        AmplifiMeshPointSensor(
+                            coordinator, config_entry, mac, sensor_type, band
+                        )
+                    )
+
+        if new_entities:
+            async_add_entities(new_entities)
+
+    async_discover_mesh_point_sensors()
+
+    config_entry.async_on_unload(
+        coordinator.async_add_listener(async_discover_mesh_point_sensors)
+    )
+
+    if not coordinator.client_rates_enabled:
+        return
+
+    @callback
+    def async_discover_client_rate_sensors(data_keys=None):
+        """Add the rate sensors of the wifi clients found by the last poll."""
+        if data_keys is None:
+            data_keys = coordinator.last_diff.added
+
+        new_entities = []
+        for data_key in data_keys:
+            if data_key not in coordinator.wifi_devices:
+                continue
+            for direction in CLIENT_RATE_SENSOR_TYPES:
+                unique_id = f"{DOMAIN}_{data_key}_{direction}_rate"
+                if unique_id not in known_unique_ids:
+                    known_unique_ids.add(unique_id)
+                    new_entities.append(
+                        AmplifiClientRateSensor(
+                            coordinator, config_entry, data_key, direction
+                        )
+                    )
+
+        if new_entities:
+            async_add_entities(new_entities)
+
+    async_discover_client_rate_sensors(coordinator.wifi_devices)
+
+    config_entry.async_on_unload(
+        coordinator.async_add_listener(async_discover_client_rate_sensors)
+    )
+
 class AmplifiWanSpeedSensor(CoordinatorEntity, SensorEntity):
     """Sensor class representing a internet speed of amplifi."""
 
@@ -46,8 +203,10 @@ class AmplifiWanSpeedSensor(CoordinatorEntity, SensorEntity):
 
     def __init__(self, coordinator, config_entry, speed_sensor_type):
         """Initialize amplifi sensor."""
-        self.unique_id = f"{DOMAIN}_wan_{speed_sensor_type}_speed"
-        self._name = self.unique_id
+        self.unique_id = (
+            f"{DOMAIN}_{config_entry.entry_id}_wan_{speed_sensor_type}_speed"
+        )
+        self._name = f"{DOMAIN}_wan_{speed_sensor_type}_speed"
         self.config_entry = config_entry
         self._speed_sensor_type = speed_sensor_type
         self._value = 0
@@ -88,16 +247,286 @@ class AmplifiWanSpeedSensor(CoordinatorEntity, SensorEntity):
     async def async_added_to_hass(self):
         """Run when this Entity has been added to HA."""
         entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities[self.unique_id] = self.unique_id
+        entities.add(self.unique_id)
         await super().async_added_to_hass()
 
     async def async_will_remove_from_hass(self):
         """Entity being removed from hass."""
         entities = self.hass.data[DOMAIN][self.config_entry.entry_id][ENTITIES]
-        entities.pop(self.unique_id)
+        entities.discard(self.unique_id)
         await super().async_will_remove_from_hass()
 
     @callback
     def _handle_coordinator_update(self):
         self._value = self.coordinator.wan_speeds[self._speed_sensor_type]
         super()._handle_coordinator_update()
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class AmplifiPollStatSensor(AmplifiEntity, SensorEntity):
+    """Median of a poll pipeline metric, p95 and max as attributes."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_icon = "mdi:timer-outline"
+
+    def __init__(self, coordinator, config_entry, metric):
+        """Initialize the poll statistics sensor."""
+        super().__init__(coordinator, POLL_STATS_KEY)
+        self.config_entry = config_entry
+        self._metric = metric
+        self._attr_unique_id = f"{DOMAIN}_{config_entry.entry_id}_poll_{metric}"
+        self._attr_name = f"Amplifi Poll {metric.replace('_', ' ').title()}"
+        (
+            self._attr_device_class,
+            self._attr_native_unit_of_measurement,
+        ) = POLL_STAT_SENSOR_TYPES[metric]
+
+    @property
+    def available(self):
+        """Return True, the statistics are kept while the router is down."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return the median of the window."""
+        return _round(self.coordinator.poll_stats.summary(self._metric)["p50"])
+
+    def _build_attributes(self):
+        """Return the p95 and max of the window."""
+        summary = self.coordinator.poll_stats.summary(self._metric)
+        return {
+            "p95": _round(summary["p95"]),
+            "max": _round(summary["max"]),
+            "samples": len(self.coordinator.poll_stats.metrics[self._metric]),
+        }
+
+
+class AmplifiPollCounterSensor(AmplifiEntity, SensorEntity):
+    """Number of re-authentications or failed polls since start up."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_icon = "mdi:counter"
+
+    def __init__(self, coordinator, config_entry, counter):
+        """Initialize the poll counter sensor."""
+        super().__init__(coordinator, POLL_STATS_KEY)
+        self.config_entry = config_entry
+        self._counter = counter
+        self._attr_unique_id = f"{DOMAIN}_{config_entry.entry_id}_poll_{counter}"
+        self._attr_name = f"Amplifi Poll {counter.title()}"
+
+    @property
+    def available(self):
+        """Return True, the counters are kept while the router is down."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return the value of the counter."""
+        return self.coordinator.poll_counters[self._counter]
+
+
+class AmplifiBreakerSensor(AmplifiEntity, SensorEntity):
+    """State of the circuit breaker of the router."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_options = BREAKER_STATES
+    _attr_icon = "mdi:electric-switch"
+
+    def __init__(self, coordinator, config_entry):
+        """Initialize the circuit breaker sensor."""
+        super().__init__(coordinator, BREAKER_KEY)
+        self.config_entry = config_entry
+        self._attr_unique_id = f"{DOMAIN}_{config_entry.entry_id}_breaker"
+        self._attr_name = "Amplifi Circuit Breaker"
+
+    @property
+    def available(self):
+        """Return True, the breaker is most useful while the router is down."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return closed, open or half_open."""
+        return self.coordinator.breaker.state
+
+    def _build_attributes(self):
+        """Return the failures and probes of the breaker."""
+        breaker = self.coordinator.breaker
+        return {
+            "failures": breaker.failures,
+            "probes": breaker.probes,
+            "reset_timeout": breaker.reset_timeout,
+        }
+
+
+class AmplifiWanStatisticSensor(AmplifiEntity, SensorEntity):
+    """Mean, p95 or peak of a WAN rate over a rolling window."""
+
+    _attr_device_class = SensorDeviceClass.DATA_RATE
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfDataRate.MEGABITS_PER_SECOND
+
+    def __init__(self, coordinator, config_entry, direction, statistic, seconds):
+        """Initialize the WAN statistics sensor."""
+        super().__init__(coordinator, WAN_STATISTICS_KEY)
+        self.config_entry = config_entry
+        self._direction = direction
+        self._statistic = statistic
+        self._seconds = seconds
+        minutes = seconds // 60
+        self._attr_unique_id = (
+            f"{DOMAIN}_{config_entry.entry_id}_wan_{direction}_{statistic}_{minutes}m"
+        )
+        self._attr_name = (
+            f"Amplifi WAN {direction.title()} {statistic.title()} {minutes}m"
+        )
+        self._attr_icon = f"mdi:{direction}-network"
+
+    @property
+    def native_value(self):
+        """Return the statistic of the window in Mbps."""
+        return _round(
+            self.coordinator.wan_statistics(self._seconds, self._direction)[
+                self._statistic
+            ]
+        )
+
+
+class AmplifiDataUsageSensor(AmplifiEntity, SensorEntity):
+    """WAN bytes downloaded or uploaded in the current day or month."""
+
+    _attr_device_class = SensorDeviceClass.DATA_SIZE
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = UnitOfInformation.BYTES
+    _attr_suggested_unit_of_measurement = UnitOfInformation.GIGABYTES
+
+    def __init__(self, coordinator, config_entry, direction, period):
+        """Initialize the data usage sensor."""
+        super().__init__(coordinator, DATA_USAGE_KEY)
+        self.config_entry = config_entry
+        self._direction = direction
+        self._period = period
+        self._attr_unique_id = (
+            f"{DOMAIN}_{config_entry.entry_id}_wan_{direction}_{period}_usage"
+        )
+        self._attr_name = f"Amplifi WAN {direction.title()} {period.title()} Usage"
+        self._attr_icon = f"mdi:{direction}-network"
+
+    @property
+    def available(self):
+        """Return True, the totals are kept while the router is down."""
+        return True
+
+    @property
+    def native_value(self):
+        """Return the bytes of the period."""
+        return self.coordinator.data_usage(self._period, self._direction)
+
+
+def _mesh_point_unique_id(mac_addr, sensor_type, band):
+    """Return the unique ID of a sensor of a mesh point."""
+    if band is None:
+        return f"{DOMAIN}_{mac_addr}_{sensor_type}"
+    return f"{DOMAIN}_{mac_addr}_{slugify(band)}_clients"
+
+
+class AmplifiMeshPointSensor(AmplifiEntity, SensorEntity):
+    """Client count, band client count or client throughput of a mesh point."""
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, config_entry, mac_addr, sensor_type, band=None):
+        """Initialize the mesh point sensor."""
+        super().__init__(coordinator, (MESH_POINT_KEY, mac_addr))
+        self.config_entry = config_entry
+        self._mac_addr = mac_addr
+        self._sensor_type = sensor_type
+        self._band = band
+
+        mesh_point = coordinator.mesh_points[mac_addr]
+        label = mesh_point.name or mac_addr.upper()
+        self._attr_unique_id = _mesh_point_unique_id(mac_addr, sensor_type, band)
+        if band is None:
+            (
+                name,
+                self._attr_device_class,
+                self._attr_native_unit_of_measurement,
+                self._attr_icon,
+            ) = MESH_POINT_SENSOR_TYPES[sensor_type]
+            self._attr_name = f"Amplifi {label} {name}"
+        else:
+            self._attr_icon = "mdi:account-multiple"
+            self._attr_name = f"Amplifi {label} {band} Clients"
+
+    @property
+    def native_value(self):
+        """Return the aggregate of the clients of the mesh point."""
+        stats = self.coordinator.mesh_point_stats(self._mac_addr)
+        if stats is None:
+            return 0
+        if self._band is not None:
+            return stats.bands.get(self._band, 0)
+        if self._sensor_type == "clients":
+            return stats.clients
+        if self._sensor_type == "clients_rx_rate":
+            return round(stats.rx_rate, 3)
+        return round(stats.tx_rate, 3)
+
+    def _build_attributes(self):
+        """Return where the mesh point sits in the mesh."""
+        if self._sensor_type != "clients":
+            return None
+        mesh_point = self.coordinator.mesh_points.get(self._mac_addr)
+        if mesh_point is None:
+            return None
+        return {
+            "role": mesh_point.role,
+            "parent": mesh_point.parent,
+            "level": mesh_point.level,
+            "link_quality": mesh_point.link_quality,
+        }
+
+
+class AmplifiClientRateSensor(AmplifiEntity, SensorEntity):
+    """Receive or transmit rate of a wifi client, from its byte counters."""
+
+    _attr_device_class = SensorDeviceClass.DATA_RATE
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfDataRate.MEGABITS_PER_SECOND
+    _attr_suggested_display_precision = 3
+
+    def __init__(self, coordinator, config_entry, mac_addr, direction):
+        """Initialize the client rate sensor."""
+        super().__init__(coordinator, (CLIENT_RATE_KEY, mac_addr))
+        self.config_entry = config_entry
+        self._mac_addr = mac_addr
+        self._index = CLIENT_RATE_SENSOR_TYPES[direction]
+        self._attr_unique_id = f"{DOMAIN}_{mac_addr}_{direction}_rate"
+        self._attr_icon = f"mdi:{'download' if direction == 'rx' else 'upload'}-network"
+
+        device = coordinator.wifi_devices[mac_addr]
+        for label in (device.description, device.hostname, device.ip):
+            if label is not None:
+                break
+        else:
+            label = mac_addr.upper()
+        self._attr_name = f"Amplifi {label} {direction.upper()} Rate"
+
+    @property
+    def entity_registry_enabled_default(self) -> bool:
+        """Return if the entity should be enabled when first added to the entity registry."""
+        return self.config_entry.data.get(CONF_ENABLE_NEW_DEVICES, False)
+
+    @property
+    def native_value(self):
+        """Return the rate in Mbps."""
+        return round(self.coordinator.client_rate(self._mac_addr)[self._index], 3)
@@ -0,0 +1,294 @@
+"""Normalised snapshot of the Amplifi info-async.php payload."""
+import logging
+
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+
+from .const import TIER_PRESENCE, TIER_WAN
+from .records import EthernetDevice, WifiDevice
+from .topology import MeshPoint, extract_mesh_points
+
+_LOGGER = logging.getLogger(__name__)
+
+TOPOLOGY_IDX = 0
+WIFI_DEVICES_IDX = 1
+DEVICES_INFO_IDX = 2
+ETHERNET_PORT_TO_DEVICE_IDX = 3
+ETHERNET_PORTS_IDX = 4
+
+WAN_PORT = "eth-0"
+
+# Sections of the payload a light request of each tier has to carry
+TIER_SECTIONS = {
+    TIER_WAN: (ETHERNET_PORTS_IDX,),
+    TIER_PRESENCE: (
+        WIFI_DEVICES_IDX,
+        DEVICES_INFO_IDX,
+        ETHERNET_PORT_TO_DEVICE_IDX,
+        ETHERNET_PORTS_IDX,
+    ),
+}
+
+
+def _empty():
+    return MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class AmplifiDiff:
+    """Keys (MAC address or port) that changed between two polls."""
+
+    added: frozenset = field(default_factory=frozenset)
+    removed: frozenset = field(default_factory=frozenset)
+    changed: frozenset = field(default_factory=frozenset)
+    # Set when every entity must be refreshed, e.g. when availability changed
+    full: bool = False
+
+    def __contains__(self, key):
+        return (
+            self.full
+            or key in self.added
+            or key in self.removed
+            or key in self.changed
+        )
+
+    def __bool__(self):
+        return self.full or bool(self.added or self.removed or self.changed)
+
+    @property
+    def updated(self):
+        """Return every key that was added, removed or changed."""
+        return self.added | self.removed | self.changed
+
+
+@dataclass(frozen=True)
+class AmplifiSnapshot:
+    """Immutable, indexed view of a single poll of the router."""
+
+    router_mac: str = None
+    # MAC address -> WifiDevice
+    wifi_devices: MappingProxyType = field(default_factory=_empty)
+    # Port (eth-N) -> link info of the router
+    ethernet_ports: MappingProxyType = field(default_factory=_empty)
+    # MAC address -> EthernetDevice connected to an ethernet port
+    ethernet_devices: MappingProxyType = field(default_factory=_empty)
+    # Access point MAC address -> MAC addresses of its wifi clients
+    access_points: MappingProxyType = field(default_factory=_empty)
+    wan_speeds: MappingProxyType = field(
+        default_factory=lambda: MappingProxyType({"download": 0, "upload": 0})
+    )
+    # MAC address -> MeshPoint, only refreshed by full responses
+    mesh_points: MappingProxyType = field(default_factory=_empty)
+
+    def items(self):
+        """Return every entity backed item keyed by MAC address or port."""
+        return {**self.ethernet_ports, **self.ethernet_devices, **self.wifi_devices}
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the snapshot."""
+        return {
+            "router_mac": self.router_mac,
+            "wifi_devices": {k: v.as_dict() for k, v in self.wifi_devices.items()},
+            "ethernet_ports": {k: dict(v) for k, v in self.ethernet_ports.items()},
+            "ethernet_devices": {
+                k: v.as_dict() for k, v in self.ethernet_devices.items()
+            },
+            "access_points": {k: sorted(v) for k, v in self.access_points.items()},
+            "wan_speeds": dict(self.wan_speeds),
+            "mesh_points": {k: v.as_dict() for k, v in self.mesh_points.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a snapshot from the output of as_dict."""
+
+        def _freeze(items, record=MappingProxyType):
+            return MappingProxyType({k: record(v) for k, v in items.items()})
+
+        return cls(
+            router_mac=data["router_mac"],
+            wifi_devices=_freeze(data["wifi_devices"], WifiDevice.from_dict),
+            ethernet_ports=_freeze(data["ethernet_ports"]),
+            ethernet_devices=_freeze(
+                data["ethernet_devices"], EthernetDevice.from_dict
+            ),
+            access_points=MappingProxyType(
+                {k: frozenset(v) for k, v in data["access_points"].items()}
+            ),
+            wan_speeds=MappingProxyType(data["wan_speeds"]),
+            mesh_points=_freeze(data.get("mesh_points", {}), MeshPoint.from_dict),
+        )
+
+
+def find_router_mac_in_topology(topology_data):
+    """Recursively search the topology for the MAC address of the router."""
+    if not isinstance(topology_data, dict):
+        return None
+    if topology_data.get("role") == "Router" and "mac" in topology_data:
+        return topology_data["mac"]
+    for value in topology_data.values():
+        if isinstance(value, dict):
+            router_mac_addr = find_router_mac_in_topology(value)
+            if router_mac_addr is not None:
+                return router_mac_addr
+    return None
+
+
+def extract_wifi_devices(raw_wifi_devices, keep_raw=False):
+    """Return the wifi devices and the clients of each access point."""
+    wifi_devices = {}
+    access_points = {}
+    for access_point, wifi_bands in (raw_wifi_devices or {}).items():
+        clients = set()
+        for band, network_types in wifi_bands.items():
+            for devices in network_types.values():
+                for mac_addr, device_info in devices.items():
+                    wifi_devices[mac_addr] = WifiDevice.from_raw(
+                        mac_addr, device_info, access_point, band, keep_raw
+                    )
+                    clients.add(mac_addr)
+        access_points[access_point] = frozenset(clients)
+
+    return wifi_devices, access_points
+
+
+def extract_ethernet_devices(
+    raw_devices_info, raw_device_to_eth_index, keep_raw=False
+):
+    """Return additional device info for devices on the ethernet ports."""
+    ethernet_devices = {}
+    if raw_device_to_eth_index and raw_devices_info:
+        for mac_addr, port in raw_device_to_eth_index.items():
+            if mac_addr not in raw_devices_info:
+                continue
+            ethernet_devices[mac_addr] = EthernetDevice.from_raw(
+                mac_addr, raw_devices_info[mac_addr], port, keep_raw
+            )
+    return ethernet_devices
+
+
+def extract_wan_speeds(ethernet_ports):
+    """Return the WAN speeds in Mbps from the router's WAN port."""
+    wan_port_data = ethernet_ports.get(WAN_PORT, {})
+    return {
+        "download": wan_port_data.get("rx_bitrate", 0) / 1024,
+        "upload": wan_port_data.get("tx_bitrate", 0) / 1024,
+    }
+
+
+def extract_ethernet_ports(raw_ethernet_ports, router_mac_addr):
+    """Return the ethernet ports of the router."""
+    return {
+        port: MappingProxyType(dict(port_info))
+        for port, port_info in (raw_ethernet_ports or {})
+        .get(router_mac_addr, {})
+        .items()
+    }
+
+
+def build_snapshot(data, keep_raw=False):
+    """Normalise a raw info-async.php response in a single pass.
+
+    Only the fields of the device records are kept unless keep_raw is set,
+    nothing else of the response is referenced by the snapshot.
+    """
+    router_mac_addr = find_router_mac_in_topology(data[TOPOLOGY_IDX])
+
+    wifi_devices, access_points = extract_wifi_devices(
+        data[WIFI_DEVICES_IDX], keep_raw
+    )
+
+    ethernet_ports = extract_ethernet_ports(
+        data[ETHERNET_PORTS_IDX], router_mac_addr
+    )
+
+    ethernet_devices = extract_ethernet_devices(
+        data[DEVICES_INFO_IDX],
+        (data[ETHERNET_PORT_TO_DEVICE_IDX] or {}).get(router_mac_addr),
+        keep_raw,
+    )
+
+    snapshot = AmplifiSnapshot(
+        router_mac=router_mac_addr,
+        wifi_devices=MappingProxyType(wifi_devices),
+        ethernet_ports=MappingProxyType(ethernet_ports),
+        ethernet_devices=MappingProxyType(ethernet_devices),
+        access_points=MappingProxyType(access_points),
+        wan_speeds=MappingProxyType(extract_wan_speeds(ethernet_ports)),
+        mesh_points=MappingProxyType(extract_mesh_points(data[TOPOLOGY_IDX])),
+    )
+    _LOGGER.debug(
+        "snapshot router=%s wifi_devices=%s ethernet_devices=%s ports=%s",
+        router_mac_addr,
+        len(wifi_devices),
+        len(ethernet_devices),
+        len(ethernet_ports),
+    )
+    return snapshot
+
+
+def is_full_payload(data):
+    """Return True when the response carries every section, topology included."""
+    return (
+        isinstance(data, list)
+        and len(data) > ETHERNET_PORTS_IDX
+        and bool(data[TOPOLOGY_IDX])
+    )
+
+
+def is_partial_payload(data, tier, router_mac_addr):
+    """Return True for a light response carrying only the sections of a tier."""
+    sections = TIER_SECTIONS[tier]
+    return (
+        isinstance(data, list)
+        and len(data) > max(sections)
+        and not data[TOPOLOGY_IDX]
+        and all(isinstance(data[idx], dict) for idx in sections)
+        and router_mac_addr in data[ETHERNET_PORTS_IDX]
+    )
+
+
+def update_snapshot(previous, data, tier, keep_raw=False):
+    """Apply the sections of a light response of a tier to a snapshot."""
+    ethernet_ports = extract_ethernet_ports(
+        data[ETHERNET_PORTS_IDX], previous.router_mac
+    )
+    changes = {
+        "ethernet_ports": MappingProxyType(ethernet_ports),
+        "wan_speeds": MappingProxyType(extract_wan_speeds(ethernet_ports)),
+    }
+
+    if tier == TIER_PRESENCE:
+        wifi_devices, access_points = extract_wifi_devices(
+            data[WIFI_DEVICES_IDX], keep_raw
+        )
+        ethernet_devices = extract_ethernet_devices(
+            data[DEVICES_INFO_IDX],
+            data[ETHERNET_PORT_TO_DEVICE_IDX].get(previous.router_mac),
+            keep_raw,
+        )
+        changes.update(
+            wifi_devices=MappingProxyType(wifi_devices),
+            access_points=MappingProxyType(access_points),
+            ethernet_devices=MappingProxyType(ethernet_devices),
+        )
+
+    return replace(previous, **changes)
+
+
+def diff_snapshots(previous, current):
+    """Diff two snapshots per MAC address / port."""
+    if previous is None:
+        return AmplifiDiff(added=frozenset(current.items()), full=True)
+
+    previous_items = previous.items()
+    items = current.items()
+    return AmplifiDiff(
+        added=frozenset(items.keys() - previous_items.keys()),
+        removed=frozenset(previous_items.keys() - items.keys()),
+        changed=frozenset(
+            key
+            for key in items.keys() & previous_items.keys()
+            if items[key] != previous_items[key]
+        ),
+    )
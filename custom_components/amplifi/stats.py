@@ -0,0 +1,127 @@
+"""Rolling statistics of the poll pipeline."""
+import math
+
+from collections import deque
+
+# Stages of a poll, in the order they run
+STAGE_LOGIN = "login"
+STAGE_REQUEST = "request"
+STAGE_DECODE = "decode"
+STAGE_EXTRACT = "extract"
+STAGE_TOTAL = "total"
+STAGES = (STAGE_LOGIN, STAGE_REQUEST, STAGE_DECODE, STAGE_EXTRACT, STAGE_TOTAL)
+
+METRIC_PAYLOAD_BYTES = "payload_bytes"
+METRIC_DEVICES = "devices"
+# Decode and extraction time spent on the event loop rather than an executor
+METRIC_LOOP_BLOCKED = "loop_blocked"
+
+# Re-authentications are counted by the client, failed polls here
+COUNTER_REAUTH = "reauth"
+COUNTER_FAILURES = "failures"
+
+
+def percentile(sorted_samples, fraction):
+    """Return the nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return None
+    rank = math.ceil(fraction * len(sorted_samples)) - 1
+    return sorted_samples[min(max(rank, 0), len(sorted_samples) - 1)]
+
+
+class RollingStats:
+    """The last samples of a metric with their p50, p95 and max."""
+
+    def __init__(self, window):
+        """Initialize with the number of samples to keep."""
+        self._samples = deque(maxlen=window)
+        self._summary = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, value):
+        """Add a sample, the oldest one drops out once the window is full."""
+        self._samples.append(value)
+        self._summary = None
+
+    def summary(self):
+        """Return the p50, p95 and max of the window, None when empty."""
+        if self._summary is None:
+            ordered = sorted(self._samples)
+            self._summary = {
+                "p50": percentile(ordered, 0.5),
+                "p95": percentile(ordered, 0.95),
+                "max": ordered[-1] if ordered else None,
+            }
+        return self._summary
+
+
+class PollStats:
+    """Collect stage latencies and sizes of every poll.
+
+    The client and the coordinator add the time spent in each stage while a
+    poll runs, finish_poll() then moves the totals of that poll into the
+    rolling windows. Latencies are kept in milliseconds.
+    """
+
+    def __init__(self, window):
+        """Initialize with the number of polls kept per metric."""
+        self.metrics = {
+            name: RollingStats(window)
+            for name in (
+                *STAGES,
+                METRIC_LOOP_BLOCKED,
+                METRIC_PAYLOAD_BYTES,
+                METRIC_DEVICES,
+            )
+        }
+        self.counters = {COUNTER_FAILURES: 0}
+        self._current = {}
+
+    def start_poll(self):
+        """Start collecting the stages of a new poll."""
+        self._current = {}
+
+    def add_time(self, stage, seconds):
+        """Add time spent in a stage of the running poll."""
+        self._current[stage] = self._current.get(stage, 0.0) + seconds * 1000
+
+    def add_bytes(self, size):
+        """Add the size of a response received by the running poll."""
+        self._current[METRIC_PAYLOAD_BYTES] = (
+            self._current.get(METRIC_PAYLOAD_BYTES, 0) + size
+        )
+
+    def increment(self, counter):
+        """Increment one of the counters."""
+        self.counters[counter] += 1
+
+    def abort_poll(self):
+        """Drop the stages collected by a poll that did not finish."""
+        self._current = {}
+
+    def finish_poll(self, seconds, devices=None):
+        """Record the running poll, devices is None when it failed."""
+        if devices is None:
+            self.increment(COUNTER_FAILURES)
+        else:
+            self.metrics[METRIC_DEVICES].add(devices)
+        self._current[STAGE_TOTAL] = seconds * 1000
+        for name, value in self._current.items():
+            self.metrics[name].add(value)
+        self._current = {}
+
+    def summary(self, name):
+        """Return the p50, p95 and max of a metric."""
+        return self.metrics[name].summary()
+
+    def as_dict(self):
+        """Return every summary and counter."""
+        return {
+            "metrics": {
+                name: {**stats.summary(), "samples": len(stats)}
+                for name, stats in self.metrics.items()
+            },
+            "counters": dict(self.counters),
+        }
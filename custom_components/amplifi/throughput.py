@@ -0,0 +1,219 @@
+"""Throughput derived from the counters and rates reported by the router."""
+import math
+
+from array import array
+from collections import deque
+
+# Histogram buckets of the WAN percentiles: bucket 0 holds rates below
+# HISTOGRAM_MIN, each next one is HISTOGRAM_STEP times wider than the previous
+HISTOGRAM_MIN = 0.01
+HISTOGRAM_STEP = 1.025
+HISTOGRAM_BUCKETS = 600
+_LOG_STEP = math.log(HISTOGRAM_STEP)
+
+
+class ClientRates:
+    """Turn the byte counters of every wifi client into rates in Mbps.
+
+    All clients are updated in one pass per poll. A rate is measured between
+    two changes of the counters rather than between two polls, so a router
+    that refreshes its counters less often than it is polled, or a poll that
+    is answered late, does not produce a zero followed by a spike. Counters
+    that went backwards (reconnect or router restart) start a new baseline.
+    """
+
+    def __init__(self, idle_after):
+        """Initialize, rates drop to 0 when counters are idle this long."""
+        self.idle_after = idle_after
+        # MAC address -> (rx bytes, tx bytes, time of the last change)
+        self._counters = {}
+        # MAC address -> (rx Mbps, tx Mbps)
+        self.rates = {}
+
+    def update(self, devices, now):
+        """Update from the wifi devices of a poll, return the changed MACs."""
+        counters = self._counters
+        rates = self.rates
+        idle_after = self.idle_after
+        new_counters = {}
+        new_rates = {}
+        changed = set()
+
+        for mac, device in devices.items():
+            rx_bytes, tx_bytes = device.rx_bytes, device.tx_bytes
+            if rx_bytes is None or tx_bytes is None:
+                continue
+            rate = rates.get(mac, (0.0, 0.0))
+            previous = counters.get(mac)
+            if previous is None:
+                new_counters[mac] = (rx_bytes, tx_bytes, now)
+            else:
+                previous_rx, previous_tx, since = previous
+                elapsed = now - since
+                rx_delta = rx_bytes - previous_rx
+                tx_delta = tx_bytes - previous_tx
+                if rx_delta < 0 or tx_delta < 0:
+                    # Counter reset, the traffic since then is unknown
+                    new_counters[mac] = (rx_bytes, tx_bytes, now)
+                elif rx_delta or tx_delta:
+                    if elapsed > 0:
+                        rate = (
+                            rx_delta * 8 / elapsed / 1_000_000,
+                            tx_delta * 8 / elapsed / 1_000_000,
+                        )
+                    new_counters[mac] = (rx_bytes, tx_bytes, now)
+                else:
+                    # Not refreshed by the router yet unless idle for long
+                    if elapsed >= idle_after:
+                        rate = (0.0, 0.0)
+                    new_counters[mac] = previous
+            new_rates[mac] = rate
+            if rates.get(mac) != rate:
+                changed.add(mac)
+
+        # Clients that left start over when they come back
+        changed.update(rates.keys() - new_rates.keys())
+        self._counters = new_counters
+        self.rates = new_rates
+        return changed
+
+
+def _bucket(value):
+    """Return the histogram bucket of a rate in Mbps."""
+    if value < HISTOGRAM_MIN:
+        return 0
+    return min(
+        int(math.log(value / HISTOGRAM_MIN) / _LOG_STEP) + 1, HISTOGRAM_BUCKETS - 1
+    )
+
+
+class _Window:
+    """Running sum, histogram and peak candidates of the samples of a window.
+
+    Samples enter and leave in the order they were taken, so the peak is the
+    head of a deque of decreasing candidates and every statistic is updated
+    in amortised O(1). The p95 is read from the histogram, within one bucket
+    (2.5 %) of the exact value.
+    """
+
+    def __init__(self, seconds, channels):
+        self.seconds = seconds
+        # Sequence number of the oldest sample in the window
+        self.start = 0
+        self.count = 0
+        self.sums = [0.0] * channels
+        self.histograms = [[0] * HISTOGRAM_BUCKETS for _ in range(channels)]
+        # (sequence number, value) with decreasing values
+        self.peaks = [deque() for _ in range(channels)]
+
+    def add(self, seq, values):
+        self.count += 1
+        for channel, value in enumerate(values):
+            self.sums[channel] += value
+            self.histograms[channel][_bucket(value)] += 1
+            peaks = self.peaks[channel]
+            while peaks and peaks[-1][1] <= value:
+                peaks.pop()
+            peaks.append((seq, value))
+
+    def remove(self, values):
+        seq = self.start
+        self.start += 1
+        self.count -= 1
+        for channel, value in enumerate(values):
+            self.sums[channel] = self.sums[channel] - value if self.count else 0.0
+            self.histograms[channel][_bucket(value)] -= 1
+            peaks = self.peaks[channel]
+            if peaks and peaks[0][0] == seq:
+                peaks.popleft()
+
+    def summary(self, channel):
+        if not self.count:
+            return {"mean": None, "p95": None, "peak": None}
+        peak = self.peaks[channel][0][1]
+        # Walk down from the top, the p95 is among the highest samples
+        above = self.count - math.ceil(0.95 * self.count)
+        histogram = self.histograms[channel]
+        bucket = HISTOGRAM_BUCKETS - 1
+        while bucket > 0:
+            above -= histogram[bucket]
+            if above < 0:
+                break
+            bucket -= 1
+        p95 = HISTOGRAM_MIN * HISTOGRAM_STEP ** bucket if bucket else 0.0
+        return {
+            "mean": max(self.sums[channel] / self.count, 0.0),
+            "p95": min(p95, peak),
+            "peak": peak,
+        }
+
+
+class RateHistory:
+    """Fixed-size ring buffer of rate samples with rolling window statistics.
+
+    The samples of every channel (e.g. download and upload) are kept in
+    preallocated arrays, the oldest one is overwritten once the buffer is
+    full. Each window tracks the samples taken in its last seconds and is
+    updated as samples are added, so reading the mean, p95 or peak does not
+    go through the buffer. A sample taken less than min_spacing seconds after
+    the previous one is dropped, so the buffer always spans at least
+    capacity * min_spacing seconds.
+    """
+
+    def __init__(self, windows, capacity, channels=2, min_spacing=0):
+        """Initialize with the window lengths in seconds and the buffer size."""
+        self.capacity = capacity
+        self.min_spacing = min_spacing
+        self._times = array("d", bytes(8 * capacity))
+        self._values = [array("d", bytes(8 * capacity)) for _ in range(channels)]
+        # Sequence numbers of the oldest and of the next sample
+        self._oldest = 0
+        self._next = 0
+        self.windows = {seconds: _Window(seconds, channels) for seconds in windows}
+
+    def __len__(self):
+        return self._next - self._oldest
+
+    def _sample(self, seq):
+        idx = seq % self.capacity
+        return [values[idx] for values in self._values]
+
+    def add(self, now, values):
+        """Add the rates of every channel sampled at monotonic time now.
+
+        Return False when the sample was dropped for being too close to the
+        previous one.
+        """
+        seq = self._next
+        if seq > self._oldest and (
+            now - self._times[(seq - 1) % self.capacity] < self.min_spacing
+        ):
+            return False
+        if seq - self._oldest == self.capacity:
+            # Overwriting the oldest sample, windows still holding it drop it
+            oldest = self._sample(self._oldest)
+            for window in self.windows.values():
+                if window.start == self._oldest and window.count:
+                    window.remove(oldest)
+            self._oldest += 1
+
+        idx = seq % self.capacity
+        self._times[idx] = now
+        for channel, value in enumerate(values):
+            self._values[channel][idx] = value
+        self._next += 1
+
+        times = self._times
+        capacity = self.capacity
+        for window in self.windows.values():
+            if not window.count:
+                window.start = seq
+            window.add(seq, values)
+            cutoff = now - window.seconds
+            while window.start < seq and times[window.start % capacity] <= cutoff:
+                window.remove(self._sample(window.start))
+        return True
+
+    def summary(self, seconds, channel):
+        """Return the mean, p95 and peak of a channel over a window."""
+        return self.windows[seconds].summary(channel)
@@ -0,0 +1,130 @@
+"""Mesh points of the Amplifi network and the clients of each of them."""
+from typing import NamedTuple
+
+
+class MeshPoint(NamedTuple):
+    """The router or a satellite and where it sits in the mesh."""
+
+    mac: str
+    role: str = None
+    name: str = None
+    # MAC address of the mesh point it is connected to, None for the router
+    parent: str = None
+    level: int = None
+    link_quality: int = None
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the record."""
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a record from the output of as_dict."""
+        return cls(**data)
+
+
+def extract_mesh_points(topology_data):
+    """Return every mesh point of the topology section keyed by MAC address."""
+    mesh_points = {}
+    if not isinstance(topology_data, dict):
+        return mesh_points
+
+    pending = [(topology_data, None)]
+    while pending:
+        nodes, parent = pending.pop()
+        for node in nodes.values():
+            if not isinstance(node, dict):
+                continue
+            mac = node.get("mac")
+            if mac is None:
+                continue
+            mesh_points[mac] = MeshPoint(
+                mac,
+                node.get("role"),
+                node.get("friendly_name"),
+                parent,
+                node.get("level"),
+                node.get("connection_quality"),
+            )
+            if isinstance(node.get("children"), dict):
+                pending.append((node["children"], mac))
+    return mesh_points
+
+
+class MeshPointStats:
+    """Client count, per band client counts and client throughput of a mesh point."""
+
+    __slots__ = ("clients", "bands", "rx_rate", "tx_rate")
+
+    def __init__(self):
+        self.clients = 0
+        # Band -> number of clients
+        self.bands = {}
+        self.rx_rate = 0.0
+        self.tx_rate = 0.0
+
+
+class MeshIndex:
+    """Aggregate the wifi clients of every mesh point.
+
+    The topology is only replaced when the mesh points changed. The
+    aggregates are maintained from the clients that changed in a poll: the
+    contribution of each client (mesh point, band and rates) is kept, so a
+    client that joined, left, roamed or whose rate changed is moved without
+    walking the other clients.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.mesh_points = {}
+        # Access point MAC address -> MeshPointStats
+        self.stats = {}
+        # Client MAC address -> (access point, band, rx rate, tx rate)
+        self._clients = {}
+
+    def set_topology(self, mesh_points):
+        """Replace the mesh points, return the MACs of those that changed."""
+        if mesh_points == self.mesh_points:
+            return set()
+        changed = {
+            mac
+            for mac in mesh_points.keys() | self.mesh_points.keys()
+            if mesh_points.get(mac) != self.mesh_points.get(mac)
+        }
+        self.mesh_points = dict(mesh_points)
+        return changed
+
+    def update(self, devices, macs, client_rate):
+        """Apply the clients that changed, return the changed access points.
+
+        devices are the wifi devices of the poll, macs the clients that
+        joined, left, changed or whose rate changed and client_rate returns
+        the rx and tx rate of a client.
+        """
+        changed = set()
+        for mac in macs:
+            previous = self._clients.pop(mac, None)
+            if previous is not None:
+                self._apply(*previous, -1)
+                changed.add(previous[0])
+            device = devices.get(mac)
+            if device is None or device.access_point is None:
+                continue
+            contribution = (device.access_point, device.band, *client_rate(mac))
+            self._clients[mac] = contribution
+            self._apply(*contribution, 1)
+            changed.add(device.access_point)
+        return changed
+
+    def _apply(self, access_point, band, rx_rate, tx_rate, sign):
+        stats = self.stats.get(access_point)
+        if stats is None:
+            stats = self.stats[access_point] = MeshPointStats()
+        stats.clients += sign
+        stats.bands[band] = stats.bands.get(band, 0) + sign
+        if stats.clients:
+            stats.rx_rate = max(stats.rx_rate + sign * rx_rate, 0.0)
+            stats.tx_rate = max(stats.tx_rate + sign * tx_rate, 0.0)
+        else:
+            # Do not let rounding errors accumulate
+            stats.rx_rate = stats.tx_rate = 0.0
@@ -0,0 +1,99 @@
+"""Cumulative WAN data usage of the current day and month."""
+from datetime import datetime
+
+DAILY = "daily"
+MONTHLY = "monthly"
+PERIODS = (DAILY, MONTHLY)
+# Rates are only integrated between polls this many seconds apart at most,
+# traffic during a longer outage is unknown
+MAX_INTEGRATION_GAP = 300
+
+
+def _period(period, now):
+    """Return the identifier of the period now falls in."""
+    if period == DAILY:
+        return now.date().isoformat()
+    return f"{now.year:04d}-{now.month:02d}"
+
+
+class DataUsage:
+    """Count the bytes downloaded and uploaded through the WAN port.
+
+    The byte counters of the WAN port are used when the router reports them,
+    the traffic of a poll is the increase of the counters since the previous
+    one. Counters that went backwards were reset by a reboot of the router,
+    the traffic since the reboot is then the counter itself. Without
+    counters the rates of two consecutive polls are integrated. The last
+    counters are persisted with the totals, so traffic while Home Assistant
+    was stopped is counted once at the first poll after a restart.
+    """
+
+    def __init__(self):
+        """Initialize with empty totals."""
+        # Period -> [identifier, downloaded bytes, uploaded bytes]
+        self._totals = {period: [None, 0, 0] for period in PERIODS}
+        # Last WAN port counters and the time and rates of the last poll
+        self._counters = None
+        self._last_time = None
+        self._last_rates = None
+
+    def total(self, period, channel, now):
+        """Return the bytes of a channel (0 download, 1 upload) in a period."""
+        identifier, *totals = self._totals[period]
+        if identifier != _period(period, now):
+            return 0
+        return totals[channel]
+
+    def update(self, now, counters, rates):
+        """Add the traffic of a poll.
+
+        now is the local time of the poll, counters the received and sent
+        bytes of the WAN port or None when not reported and rates the
+        download and upload rates in Mbps.
+        """
+        traffic = (0, 0)
+        if counters is not None:
+            if self._counters is not None:
+                traffic = tuple(
+                    value - previous if value >= previous else value
+                    for value, previous in zip(counters, self._counters)
+                )
+            self._counters = counters
+        else:
+            self._counters = None
+            if self._last_time is not None and self._last_rates is not None:
+                elapsed = (now - self._last_time).total_seconds()
+                if 0 < elapsed <= MAX_INTEGRATION_GAP:
+                    traffic = tuple(
+                        round((previous + rate) / 2 * 1_000_000 / 8 * elapsed)
+                        for rate, previous in zip(rates, self._last_rates)
+                    )
+        self._last_time = now
+        self._last_rates = tuple(rates)
+
+        for period, totals in self._totals.items():
+            identifier = _period(period, now)
+            if totals[0] != identifier:
+                totals[:] = [identifier, 0, 0]
+            totals[1] += traffic[0]
+            totals[2] += traffic[1]
+
+    def as_dict(self):
+        """Return a JSON serialisable representation of the usage."""
+        return {
+            "totals": {period: list(totals) for period, totals in self._totals.items()},
+            "counters": list(self._counters) if self._counters else None,
+            "last_time": self._last_time.isoformat() if self._last_time else None,
+            "last_rates": list(self._last_rates) if self._last_rates else None,
+        }
+
+    def restore(self, data):
+        """Restore the output of as_dict."""
+        for period in PERIODS:
+            identifier, downloaded, uploaded = data["totals"][period]
+            self._totals[period] = [identifier, int(downloaded), int(uploaded)]
+        self._counters = tuple(data["counters"]) if data["counters"] else None
+        self._last_time = (
+            datetime.fromisoformat(data["last_time"]) if data["last_time"] else None
+        )
+        self._last_rates = tuple(data["last_rates"]) if data["last_rates"] else None
@@ -0,0 +1,61 @@
+"""Fixtures of the Amplifi tests."""
+import pytest
+
+from aiohttp.test_utils import TestServer
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.amplifi.const import CONF_ENABLE_NEW_DEVICES, COORDINATOR, DOMAIN
+from tools.mock_router import MockRouter, MockRouterConfig
+
+pytest_plugins = ["pytest_homeassistant_custom_component"]
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Load the integration from custom_components."""
+    yield
+
+
+@pytest.fixture
+def router_config():
+    """Return the shape of the network of the mock router."""
+    return MockRouterConfig(clients=5)
+
+
+@pytest.fixture
+async def mock_router(socket_enabled, router_config):
+    """Serve the mock router on a local port, host is set on the router."""
+    router = MockRouter(router_config)
+    server = TestServer(router.create_app(), host="127.0.0.1")
+    await server.start_server()
+    router.host = f"127.0.0.1:{server.port}"
+    yield router
+    await server.close()
+
+
+@pytest.fixture
+def entry_options():
+    """Return the options of the config entry."""
+    return {}
+
+
+@pytest.fixture
+async def coordinator(hass, mock_router, entry_options):
+    """Set up an entry polling the mock router and return its coordinator.
+
+    Scheduled polls are disabled, tests poll with async_refresh().
+    """
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            "host": mock_router.host,
+            "password": mock_router.config.password,
+            CONF_ENABLE_NEW_DEVICES: True,
+        },
+        options=entry_options,
+        pref_disable_polling=True,
+    )
+    entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(entry.entry_id)
+    await hass.async_block_till_done()
+    return hass.data[DOMAIN][entry.entry_id][COORDINATOR]
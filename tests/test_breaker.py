@@ -0,0 +1,118 @@
+"""Tests of the circuit breaker."""
+from homeassistant.const import STATE_UNAVAILABLE
+
+from custom_components.amplifi.breaker import CircuitBreaker
+from custom_components.amplifi.const import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    BREAKER_THRESHOLD,
+    TIER_WAN,
+)
+
+
+def test_opens_after_threshold():
+    """The breaker only opens after threshold consecutive failures."""
+    breaker = CircuitBreaker(3, 30, 300)
+
+    assert not breaker.failure(0)
+    assert not breaker.failure(1)
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.failure(2)
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.retry_at == 32
+    assert not breaker.probe_due(31)
+    assert breaker.probe_due(32)
+
+
+def test_success_resets_failures():
+    """Failures must be consecutive to open the breaker."""
+    breaker = CircuitBreaker(3, 30, 300)
+    breaker.failure(0)
+    breaker.failure(1)
+
+    assert not breaker.success()
+    assert not breaker.failure(2)
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_failed_probes_double_the_timeout():
+    """Every failed probe doubles the timeout up to the maximum."""
+    breaker = CircuitBreaker(1, 30, 100)
+    breaker.failure(0)
+
+    timeouts = []
+    for now in (30, 100, 200, 300):
+        breaker.start_probe()
+        assert breaker.state == BREAKER_HALF_OPEN
+        assert breaker.failure(now)
+        timeouts.append(breaker.reset_timeout)
+
+    assert timeouts == [60, 100, 100, 100]
+    assert breaker.probes == 4
+    assert breaker.as_dict(350) == {
+        "state": BREAKER_OPEN,
+        "failures": 5,
+        "probes": 4,
+        "reset_timeout": 100,
+        "retry_in": 50,
+    }
+
+
+def test_successful_probe_closes():
+    """A successful probe closes the breaker and resets the timeout."""
+    breaker = CircuitBreaker(1, 30, 100)
+    breaker.failure(0)
+    breaker.start_probe()
+    breaker.failure(30)
+    breaker.start_probe()
+
+    assert breaker.success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.reset_timeout == 30
+    assert breaker.retry_at is None
+    assert breaker.as_dict(100)["retry_in"] is None
+
+
+async def test_router_down(hass, coordinator, mock_router):
+    """An unavailable router opens the breaker, a probe closes it again."""
+    mock_router.unavailable = True
+    for _ in range(BREAKER_THRESHOLD):
+        await coordinator.async_refresh()
+    assert coordinator.breaker.state == BREAKER_OPEN
+
+    # No request until the probe is due
+    requests = dict(mock_router.requests)
+    await coordinator.async_refresh()
+    assert not coordinator.last_update_success
+    assert mock_router.requests == requests
+
+    # The probe only requests the login page
+    coordinator.breaker.retry_at = 0
+    await coordinator.async_refresh()
+    assert coordinator.breaker.state == BREAKER_OPEN
+    assert coordinator.breaker.probes == 1
+    assert mock_router.requests["login_page"] == requests["login_page"] + 1
+    assert mock_router.requests["info_async"] == requests["info_async"]
+
+    mock_router.unavailable = False
+    coordinator.breaker.retry_at = 0
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert coordinator.last_update_success
+    assert coordinator.breaker.state == BREAKER_CLOSED
+
+    state = hass.states.get("sensor.amplifi_circuit_breaker")
+    assert state is not None and state.state != STATE_UNAVAILABLE
+    assert state.state == BREAKER_CLOSED
+
+
+async def test_requested_tier_dropped_while_open(hass, coordinator, mock_router):
+    """A poll requested while the breaker is open does not outlive it."""
+    mock_router.unavailable = True
+    for _ in range(BREAKER_THRESHOLD):
+        await coordinator.async_refresh()
+
+    coordinator._forced_tier = TIER_WAN
+    await coordinator.async_refresh()
+    assert coordinator._forced_tier is None
@@ -0,0 +1,81 @@
+"""Tests of the session handling of the Amplifi client."""
+import asyncio
+
+import pytest
+
+from custom_components.amplifi.client import AmplifiAuthError
+from tools.mock_router import MockRouterConfig
+
+
+@pytest.fixture
+def router_config():
+    """Invalidate the session on every third data request."""
+    return MockRouterConfig(clients=5, invalidate_every=3)
+
+
+async def test_login_once(hass, coordinator, mock_router):
+    """Polls reuse the session of the first login."""
+    mock_router.config.invalidate_every = 0
+    for _ in range(3):
+        await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert mock_router.requests["login"] == 1
+    assert coordinator.poll_counters["reauth"] == 0
+
+
+async def test_reauth_within_the_poll(hass, coordinator, mock_router):
+    """An invalidated session is replaced without failing the poll."""
+    logins = mock_router.requests["login"]
+    login_pages = mock_router.requests["login_page"]
+
+    for _ in range(4):
+        await coordinator.async_refresh()
+        assert coordinator.last_update_success
+
+    assert coordinator.poll_counters["reauth"] == 2
+    assert mock_router.requests["login"] == logins + 2
+    # The login token of the page the router redirected to is reused, the
+    # only login page requests are the redirects themselves
+    assert mock_router.requests["login_page"] == login_pages + 2
+
+
+async def test_web_ui_login(hass, coordinator, mock_router):
+    """A login to the web UI between two polls only costs a login."""
+    mock_router.config.invalidate_every = 0
+    mock_router.invalidate_sessions()
+
+    await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert coordinator.poll_counters["reauth"] == 1
+    assert len(coordinator.wifi_devices) == 5
+
+
+async def test_wrong_password(hass, coordinator, mock_router):
+    """A rejected password is told apart from a network error."""
+    mock_router.config.invalidate_every = 0
+    mock_router.config.password = "changed"
+    mock_router.invalidate_sessions()
+
+    await coordinator.async_refresh()
+
+    assert not coordinator.last_update_success
+    assert isinstance(coordinator.last_exception.__cause__, AmplifiAuthError)
+
+
+async def test_cancelled_login(hass, coordinator, mock_router):
+    """Cancelling the client during the login propagates the cancellation."""
+    client = coordinator._client
+    client._handle_client_failure()
+    mock_router.config.latency = 1
+    login_page_requests = mock_router.requests["login_page"]
+
+    task = hass.async_create_task(client.async_get_devices())
+    while mock_router.requests["login_page"] == login_page_requests:
+        await asyncio.sleep(0.01)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert client.export_session() is None
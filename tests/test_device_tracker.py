@@ -0,0 +1,58 @@
+"""Tests of the attributes of the device trackers."""
+import pytest
+
+from custom_components.amplifi.const import (
+    CONF_EXCLUDED_ATTRIBUTES,
+    HIGH_CHURN_ATTRIBUTES,
+    LAST_SEEN,
+    TIER_PRESENCE,
+    TIER_WAN,
+)
+from tools.mock_router import client_macs
+
+
+def _wifi_states(hass, mock_router):
+    macs = set(client_macs(mock_router.config))
+    return [
+        state
+        for state in hass.states.async_all("device_tracker")
+        if state.attributes.get("mac") in macs
+    ]
+
+
+async def test_last_seen_stamped_every_poll(hass, coordinator, mock_router):
+    """Every poll that refreshes the devices stamps last_seen."""
+    mock_router.config.light_requests = True
+    for tier in (TIER_PRESENCE, TIER_WAN):
+        coordinator._forced_tier = tier
+        await coordinator.async_refresh()
+        await hass.async_block_till_done()
+
+    states = _wifi_states(hass, mock_router)
+    assert len(states) == len(client_macs(mock_router.config))
+    for state in states:
+        # The WAN poll did not see the devices
+        assert state.attributes[LAST_SEEN] == coordinator.seen_time.isoformat()
+        assert coordinator.seen_time < coordinator.poll_time
+
+
+@pytest.mark.parametrize(
+    "entry_options",
+    [{CONF_EXCLUDED_ATTRIBUTES: HIGH_CHURN_ATTRIBUTES}],
+)
+async def test_last_seen_excluded(hass, coordinator, mock_router):
+    """Without last_seen unchanged devices are not written."""
+    written = []
+    hass.bus.async_listen(
+        "state_changed", lambda event: written.append(event.data["entity_id"])
+    )
+    mock_router.config.light_requests = True
+    coordinator._forced_tier = TIER_PRESENCE
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+
+    states = _wifi_states(hass, mock_router)
+    assert states
+    for state in states:
+        assert LAST_SEEN not in state.attributes
+        assert state.entity_id not in written
@@ -0,0 +1,124 @@
+"""Tests of the fallback from light to full requests."""
+import pytest
+
+from custom_components.amplifi.const import (
+    LIGHT_REQUEST_MAX_FAILURES,
+    TIER_PRESENCE,
+    TIER_WAN,
+)
+from tools.mock_router import MockRouterConfig
+
+
+async def _async_poll(coordinator, tier):
+    coordinator._forced_tier = tier
+    await coordinator.async_refresh()
+
+
+@pytest.fixture
+def router_config(request):
+    """Return a router answering light requests unless told otherwise."""
+    return MockRouterConfig(clients=5, **getattr(request, "param", {}))
+
+
+@pytest.mark.parametrize("tier", [TIER_WAN, TIER_PRESENCE])
+async def test_light_request_supported(hass, coordinator, mock_router, tier):
+    """Light requests are kept when the router answers them."""
+    mock_router.config.light_requests = True
+    for _ in range(3):
+        await _async_poll(coordinator, tier)
+        assert coordinator.last_update_success
+
+    assert tier in coordinator._info_modes
+    assert coordinator._tiers.intervals[TIER_WAN] is not None
+
+
+@pytest.mark.parametrize("tier", [TIER_WAN, TIER_PRESENCE])
+async def test_light_request_ignored(hass, coordinator, mock_router, tier):
+    """A router answering with a full payload gets full requests only."""
+    await _async_poll(coordinator, tier)
+
+    assert coordinator.last_update_success
+    assert tier not in coordinator._info_modes
+    if tier == TIER_WAN:
+        assert coordinator._tiers.intervals[TIER_WAN] is None
+
+    # The full payload answered the poll, no second request was needed
+    polls = mock_router.polls
+    await _async_poll(coordinator, tier)
+    assert mock_router.polls == polls + 1
+
+
+@pytest.mark.parametrize("unknown_modes", ["empty", "error", "page"])
+@pytest.mark.parametrize("tier", [TIER_WAN, TIER_PRESENCE])
+async def test_light_request_refused(hass, coordinator, mock_router, tier, unknown_modes):
+    """A refused light request is retried with a full request and dropped."""
+    mock_router.config.unknown_modes = unknown_modes
+    logins = mock_router.requests["login"]
+
+    await _async_poll(coordinator, tier)
+
+    assert coordinator.last_update_success
+    assert tier not in coordinator._info_modes
+    # A login page answering the light request did not cost a login
+    assert mock_router.requests["login"] == logins
+    assert coordinator.poll_counters["reauth"] == 0
+
+    requests = mock_router.requests["info_async"]
+    await _async_poll(coordinator, tier)
+    assert mock_router.requests["info_async"] == requests + 1
+
+
+@pytest.mark.parametrize(
+    "router_config", [{"light_requests": True, "malformed_every": 3}], indirect=True
+)
+async def test_broken_light_response(hass, coordinator, mock_router):
+    """A broken light response is retried with a full request."""
+    for _ in range(3):
+        await _async_poll(coordinator, TIER_WAN)
+        assert coordinator.last_update_success
+
+    assert TIER_WAN not in coordinator._info_modes
+    assert coordinator._tiers.intervals[TIER_WAN] is None
+
+
+async def test_light_request_failing_in_a_row(hass, coordinator, mock_router):
+    """A light request is dropped once it failed too often with its retries."""
+    mock_router.config.light_requests = True
+    mock_router.config.malformed_every = 1
+    for _ in range(LIGHT_REQUEST_MAX_FAILURES - 1):
+        await _async_poll(coordinator, TIER_PRESENCE)
+        assert not coordinator.last_update_success
+        assert TIER_PRESENCE in coordinator._info_modes
+
+    await _async_poll(coordinator, TIER_PRESENCE)
+    assert TIER_PRESENCE not in coordinator._info_modes
+
+
+async def test_session_expired_during_light_request(hass, coordinator, mock_router):
+    """An expired session is renewed by the full retry, the light request stays."""
+    mock_router.config.light_requests = True
+    await _async_poll(coordinator, TIER_PRESENCE)
+    mock_router.invalidate_sessions()
+
+    await _async_poll(coordinator, TIER_PRESENCE)
+
+    assert coordinator.last_update_success
+    assert coordinator.poll_counters["reauth"] == 1
+    assert TIER_PRESENCE in coordinator._info_modes
+
+
+async def test_unavailable_router_keeps_light_request(hass, coordinator, mock_router):
+    """Transport errors are failed polls, not a firmware limitation."""
+    mock_router.config.light_requests = True
+    mock_router.unavailable = True
+    for _ in range(LIGHT_REQUEST_MAX_FAILURES):
+        await _async_poll(coordinator, TIER_WAN)
+        assert not coordinator.last_update_success
+
+    mock_router.unavailable = False
+    assert TIER_WAN in coordinator._info_modes
+    # The breaker opened, let its probe through
+    coordinator.breaker.retry_at = 0
+    await _async_poll(coordinator, TIER_WAN)
+    assert coordinator.last_update_success
+    assert TIER_WAN in coordinator._info_modes
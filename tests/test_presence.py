@@ -0,0 +1,96 @@
+"""Tests of the presence hysteresis of wifi devices."""
+from custom_components.amplifi.presence import (
+    AWAY,
+    HOME,
+    JOINING,
+    LEAVING,
+    PresenceTracker,
+)
+
+MAC = "aa:bb:cc:dd:ee:ff"
+
+
+def test_initial_snapshot_is_home():
+    """Devices of the first poll do not wait for min_online."""
+    tracker = PresenceTracker(consider_home=60, min_online=30)
+
+    assert tracker.observe({MAC}, set(), 0, initial=True) == {MAC}
+    assert tracker.is_home(MAC)
+    assert tracker.next_deadline() is None
+
+
+def test_joining_device_is_home_after_min_online():
+    """A new device is only home once it stayed for min_online."""
+    tracker = PresenceTracker(min_online=30)
+
+    assert tracker.observe({MAC}, set(), 0) == set()
+    assert tracker.state(MAC) == JOINING
+    assert not tracker.is_home(MAC)
+    assert tracker.next_deadline() == 30
+
+    assert tracker.expire(29) == set()
+    assert tracker.expire(30) == {MAC}
+    assert tracker.state(MAC) == HOME
+    assert tracker.next_deadline() is None
+
+
+def test_short_visit_is_never_home():
+    """A device leaving before min_online ran out stays away."""
+    tracker = PresenceTracker(min_online=30)
+    tracker.observe({MAC}, set(), 0)
+
+    assert tracker.observe(set(), {MAC}, 10) == set()
+    assert tracker.state(MAC) == AWAY
+    assert tracker.expire(30) == set()
+    assert tracker.next_deadline() is None
+
+
+def test_leaving_device_is_away_after_consider_home():
+    """A home device is only away once it stayed away for consider_home."""
+    tracker = PresenceTracker(consider_home=60)
+    tracker.observe({MAC}, set(), 0, initial=True)
+
+    assert tracker.observe(set(), {MAC}, 10) == set()
+    assert tracker.state(MAC) == LEAVING
+    assert tracker.is_home(MAC)
+    assert tracker.next_deadline() == 70
+
+    assert tracker.expire(70) == {MAC}
+    assert tracker.state(MAC) == AWAY
+
+
+def test_rejoin_while_leaving():
+    """A device back before consider_home ran out never left."""
+    tracker = PresenceTracker(consider_home=60, min_online=30)
+    tracker.observe({MAC}, set(), 0, initial=True)
+    tracker.observe(set(), {MAC}, 10)
+
+    assert tracker.observe({MAC}, set(), 20) == set()
+    assert tracker.state(MAC) == HOME
+    # The deadline of the leave is outdated and skipped
+    assert tracker.next_deadline() is None
+    assert tracker.expire(70) == set()
+    assert tracker.is_home(MAC)
+
+
+def test_without_grace_periods():
+    """Without grace periods presence follows the polls."""
+    tracker = PresenceTracker()
+
+    assert tracker.observe({MAC}, set(), 0) == {MAC}
+    assert tracker.observe(set(), {MAC}, 10) == {MAC}
+    assert not tracker.is_home(MAC)
+
+
+def test_next_deadline_skips_outdated_entries():
+    """Only the deadline of the latest transition of a device counts."""
+    other = "11:22:33:44:55:66"
+    tracker = PresenceTracker(consider_home=60)
+    tracker.observe({MAC, other}, set(), 0, initial=True)
+    tracker.observe(set(), {MAC}, 10)
+    tracker.observe(set(), {other}, 20)
+    tracker.observe({MAC}, set(), 30)
+
+    assert tracker.next_deadline() == 80
+    assert tracker.expire(80) == {other}
+    assert tracker.is_home(MAC)
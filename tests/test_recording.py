@@ -0,0 +1,53 @@
+"""Tests of the payload recorder."""
+import json
+
+from custom_components.amplifi import recording
+from custom_components.amplifi.recording import PayloadRecorder, read_recording
+
+MAC = "aa:bb:cc:dd:ee:ff"
+
+
+def _body(index):
+    return json.dumps([{MAC: {"ip": f"192.168.1.{index}"}}]).encode()
+
+
+def test_rotation(tmp_path):
+    """A full recording is rotated, the previous rotation is replaced."""
+    path = str(tmp_path / "recording.jsonl.gz")
+    recorder = PayloadRecorder(path, max_bytes=1)
+
+    for index in range(3):
+        recorder.record("full", _body(index), 0.1)
+
+    # Each response started a new file, only the last two are kept
+    assert len(list(read_recording(path))) == 1
+    assert len(list(read_recording(f"{path}.1"))) == 1
+    assert sorted(file.name for file in tmp_path.iterdir()) == [
+        "recording.jsonl.gz",
+        "recording.jsonl.gz.1",
+    ]
+
+
+def test_no_rotation_below_limit(tmp_path):
+    """Responses are appended until the maximum size is reached."""
+    path = str(tmp_path / "recording.jsonl.gz")
+    recorder = PayloadRecorder(path)
+
+    for index in range(3):
+        recorder.record("full", _body(index), 0.1)
+
+    assert len(list(read_recording(path))) == 3
+
+
+def test_pseudonym_cache_bounded(tmp_path, monkeypatch):
+    """The pseudonym cache is bounded and clearing it keeps the pseudonyms."""
+    monkeypatch.setattr(recording, "MAX_PSEUDONYMS", 4)
+    path = str(tmp_path / "recording.jsonl.gz")
+    recorder = PayloadRecorder(path, secret=b"secret")
+
+    for index in range(10):
+        recorder.record("full", _body(index), 0.1)
+
+    assert len(recorder._pseudonyms) <= 4
+    payloads = [line["payload"] for line in read_recording(path)]
+    assert len({next(iter(payload[0])) for payload in payloads}) == 1
@@ -0,0 +1,103 @@
+"""Tests of the daily and monthly WAN data usage."""
+from datetime import datetime, timedelta
+
+from custom_components.amplifi.usage import (
+    DAILY,
+    MAX_INTEGRATION_GAP,
+    MONTHLY,
+    DataUsage,
+)
+
+DOWNLOAD = 0
+UPLOAD = 1
+NOW = datetime(2024, 3, 15, 12, 0)
+
+
+def test_counter_deltas():
+    """The traffic of a poll is the increase of the port counters."""
+    usage = DataUsage()
+    usage.update(NOW, (1000, 500), (0, 0))
+    # The first counters are the baseline, not traffic
+    assert usage.total(DAILY, DOWNLOAD, NOW) == 0
+
+    usage.update(NOW + timedelta(seconds=10), (1500, 700), (0, 0))
+    usage.update(NOW + timedelta(seconds=20), (2500, 800), (0, 0))
+
+    assert usage.total(DAILY, DOWNLOAD, NOW) == 1500
+    assert usage.total(DAILY, UPLOAD, NOW) == 300
+    assert usage.total(MONTHLY, DOWNLOAD, NOW) == 1500
+
+
+def test_counter_reset():
+    """Counters that went backwards count from zero after the reboot."""
+    usage = DataUsage()
+    usage.update(NOW, (1000, 500), (0, 0))
+    usage.update(NOW + timedelta(seconds=10), (200, 100), (0, 0))
+
+    assert usage.total(DAILY, DOWNLOAD, NOW) == 200
+    assert usage.total(DAILY, UPLOAD, NOW) == 100
+
+
+def test_day_rollover():
+    """A new day resets the daily totals but not the monthly ones."""
+    usage = DataUsage()
+    usage.update(NOW, (0, 0), (0, 0))
+    usage.update(NOW + timedelta(seconds=10), (1000, 100), (0, 0))
+
+    tomorrow = NOW + timedelta(days=1)
+    # Nothing was counted yet today
+    assert usage.total(DAILY, DOWNLOAD, tomorrow) == 0
+    usage.update(tomorrow, (1500, 200), (0, 0))
+
+    assert usage.total(DAILY, DOWNLOAD, tomorrow) == 500
+    assert usage.total(MONTHLY, DOWNLOAD, tomorrow) == 1500
+
+
+def test_month_rollover():
+    """A new month resets both totals."""
+    usage = DataUsage()
+    last_day = datetime(2024, 3, 31, 23, 59, 50)
+    usage.update(last_day, (0, 0), (0, 0))
+    usage.update(last_day + timedelta(seconds=5), (1000, 100), (0, 0))
+
+    first_day = last_day + timedelta(seconds=20)
+    usage.update(first_day, (1200, 150), (0, 0))
+
+    assert usage.total(DAILY, DOWNLOAD, first_day) == 200
+    assert usage.total(MONTHLY, DOWNLOAD, first_day) == 200
+    assert usage.total(MONTHLY, UPLOAD, first_day) == 50
+
+
+def test_rate_integration():
+    """Without counters the average rate of two polls is integrated."""
+    usage = DataUsage()
+    usage.update(NOW, None, (8, 0))
+    usage.update(NOW + timedelta(seconds=10), None, (16, 8))
+
+    # 12 Mbps for 10 s down, 4 Mbps for 10 s up
+    assert usage.total(DAILY, DOWNLOAD, NOW) == 15_000_000
+    assert usage.total(DAILY, UPLOAD, NOW) == 5_000_000
+
+
+def test_no_integration_over_a_gap():
+    """Traffic during an outage longer than the gap is not estimated."""
+    usage = DataUsage()
+    usage.update(NOW, None, (8, 8))
+    usage.update(NOW + timedelta(seconds=MAX_INTEGRATION_GAP + 1), None, (8, 8))
+
+    assert usage.total(DAILY, DOWNLOAD, NOW) == 0
+
+
+def test_restore():
+    """Counters survive a restart, traffic meanwhile is counted once."""
+    usage = DataUsage()
+    usage.update(NOW, (1000, 500), (0, 0))
+    usage.update(NOW + timedelta(seconds=10), (2000, 600), (0, 0))
+
+    restored = DataUsage()
+    restored.restore(usage.as_dict())
+    assert restored.as_dict() == usage.as_dict()
+
+    restored.update(NOW + timedelta(hours=1), (5000, 700), (0, 0))
+    assert restored.total(DAILY, DOWNLOAD, NOW) == 4000
+    assert restored.total(DAILY, UPLOAD, NOW) == 200
@@ -0,0 +1,289 @@
+"""Benchmark the poll-to-state pipeline of the integration at scale.
+
+Starts a test Home Assistant instance (pytest-homeassistant-custom-component
+has to be installed) and the mock router (tools/mock_router.py) in process,
+adds the integration through its config flow and times every poll:
+
+    python tools/benchmark.py --clients 10,100,1000,5000 --polls 20 --save
+
+Time is split into the client request, JSON decode, extraction (snapshot and
+diff), entity dispatch and state writes. Peak memory is measured over an
+extra poll with tracemalloc. With --save the results are stored per git
+revision in tools/benchmark_results.json, every run is compared with the
+last stored revision other than its own.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from homeassistant.const import CONF_HOST, CONF_PASSWORD  # noqa: E402
+from homeassistant.helpers.entity import Entity  # noqa: E402
+from homeassistant.loader import DATA_CUSTOM_COMPONENTS  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    async_test_home_assistant,
+)
+
+from custom_components.amplifi import client as client_module  # noqa: E402
+from custom_components.amplifi import coordinator as coordinator_module  # noqa: E402
+from custom_components.amplifi.client import AmplifiClient  # noqa: E402
+from custom_components.amplifi.const import (  # noqa: E402
+    CONF_ENABLE_NEW_DEVICES,
+    COORDINATOR,
+    DOMAIN,
+)
+from tools.mock_router import MockRouter, MockRouterConfig  # noqa: E402
+
+RESULTS_FILE = os.path.join(REPO_ROOT, "tools", "benchmark_results.json")
+
+STAGES = ("request", "decode", "extract", "dispatch", "state_write", "total")
+
+
+class StageTimer:
+    """Accumulate the time spent in each stage of a poll."""
+
+    def __init__(self):
+        self.current = dict.fromkeys(STAGES, 0.0)
+        self._patches = []
+
+    def reset(self):
+        self.current = dict.fromkeys(STAGES, 0.0)
+
+    def wrap(self, owner, name, stage):
+        """Time every call of owner.name into stage until restore()."""
+        original = getattr(owner, name)
+        timer = self
+
+        if asyncio.iscoroutinefunction(original):
+
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    timer.current[stage] += time.perf_counter() - start
+
+        else:
+
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    timer.current[stage] += time.perf_counter() - start
+
+        setattr(owner, name, timed)
+        self._patches.append((owner, name, original))
+
+    def restore(self):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches.clear()
+
+    def poll_result(self):
+        """Return the stages of the last poll as exclusive times in ms."""
+        stages = dict(self.current)
+        # Nested stages are reported on their own
+        stages["dispatch"] -= stages["state_write"]
+        return {stage: seconds * 1000 for stage, seconds in stages.items()}
+
+
+class TestHomeAssistant:
+    """Start a test Home Assistant that loads custom components of the repo."""
+
+    async def __aenter__(self):
+        self._context = async_test_home_assistant()
+        # Older versions of the helper are an async generator
+        if hasattr(self._context, "__aenter__"):
+            hass = await self._context.__aenter__()
+        else:
+            hass = await self._context.__anext__()
+        hass.data.pop(DATA_CUSTOM_COMPONENTS, None)
+        return hass
+
+    async def __aexit__(self, *exc_info):
+        if hasattr(self._context, "__aexit__"):
+            await self._context.__aexit__(*exc_info)
+        else:
+            await self._context.aclose()
+
+
+async def async_run_size(clients, args):
+    """Benchmark one network size and return its result."""
+    mock = MockRouter(
+        MockRouterConfig(
+            clients=clients,
+            access_points=args.access_points,
+            ethernet_devices=args.ethernet_devices,
+            churn=args.churn,
+        )
+    )
+    server = TestServer(mock.create_app(), host="127.0.0.1")
+    await server.start_server()
+
+    async with TestHomeAssistant() as hass:
+        result = await hass.config_entries.flow.async_init(
+            DOMAIN,
+            context={"source": "user"},
+            data={
+                CONF_HOST: f"127.0.0.1:{server.port}",
+                CONF_PASSWORD: mock.config.password,
+                CONF_ENABLE_NEW_DEVICES: True,
+            },
+        )
+        await hass.async_block_till_done()
+        entry = result["result"]
+        coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+
+        timer = StageTimer()
+        timer.wrap(AmplifiClient, "_async_request_info", "request")
+        # Only time the JSON decode of the client, not the one of HA
+        client_module.json = SimpleNamespace(loads=json.loads, dumps=json.dumps)
+        timer.wrap(client_module.json, "loads", "decode")
+        for name in ("build_snapshot", "update_snapshot", "diff_snapshots"):
+            timer.wrap(coordinator_module, name, "extract")
+        timer.wrap(coordinator, "async_update_listeners", "dispatch")
+        timer.wrap(Entity, "async_write_ha_state", "state_write")
+
+        polls = []
+        try:
+            for _ in range(args.polls):
+                timer.reset()
+                start = time.perf_counter()
+                await coordinator.async_refresh()
+                await hass.async_block_till_done()
+                timer.current["total"] = time.perf_counter() - start
+                polls.append(timer.poll_result())
+
+            tracemalloc.start()
+            await coordinator.async_refresh()
+            await hass.async_block_till_done()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            timer.restore()
+            client_module.json = json
+
+        entities = len(hass.states.async_all())
+        await hass.async_stop(force=True)
+
+    await server.close()
+
+    return {
+        "clients": clients,
+        "entities": entities,
+        "polls": len(polls),
+        "median_ms": {
+            stage: round(statistics.median(p[stage] for p in polls), 3)
+            for stage in STAGES
+        },
+        "max_ms": {
+            stage: round(max(p[stage] for p in polls), 3) for stage in STAGES
+        },
+        "peak_memory_kib": round(peak_memory / 1024, 1),
+    }
+
+
+def git_revision():
+    """Return the short revision of the working tree, "-dirty" when changed."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    header = f"{'clients':>8} {'entities':>8} " + " ".join(
+        f"{stage:>12}" for stage in STAGES
+    )
+    print(header + f" {'peak KiB':>10}")
+    for result in results:
+        line = f"{result['clients']:>8} {result['entities']:>8} " + " ".join(
+            f"{result['median_ms'][stage]:>12.3f}" for stage in STAGES
+        )
+        print(line + f" {result['peak_memory_kib']:>10.1f}")
+        previous = (baseline or {}).get(str(result["clients"]))
+        if previous:
+            print(
+                f"{'':>17} "
+                + " ".join(
+                    f"{_change(previous['median_ms'][stage], result['median_ms'][stage]):>12}"
+                    for stage in STAGES
+                )
+                + f" {_change(previous['peak_memory_kib'], result['peak_memory_kib']):>10}"
+            )
+
+
+def _change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before:+.0%}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", default="10,100,1000,5000")
+    parser.add_argument("--polls", type=int, default=20)
+    parser.add_argument("--access-points", type=int, default=4)
+    parser.add_argument("--ethernet-devices", type=int, default=2)
+    parser.add_argument("--churn", type=float, default=0.02)
+    parser.add_argument("--save", action="store_true", help="store the results")
+    parser.add_argument(
+        "--revision", default=None, help="label of the results, defaults to git"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Every run warns about the custom integration
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+    results = [
+        asyncio.run(async_run_size(int(clients), args))
+        for clients in args.clients.split(",")
+    ]
+
+    stored = {}
+    if os.path.exists(RESULTS_FILE):
+        with open(RESULTS_FILE) as results_file:
+            stored = json.load(results_file)
+    revision = args.revision or git_revision()
+    baseline_revision = next(
+        (r for r in reversed(list(stored)) if r != revision), None
+    )
+    if baseline_revision:
+        print(f"Compared with {baseline_revision}")
+    print_results(results, stored.get(baseline_revision))
+
+    if args.save:
+        if revision is None:
+            raise SystemExit("No git revision found, label the results with --revision")
+        stored[revision] = {str(result["clients"]): result for result in results}
+        with open(RESULTS_FILE, "w") as results_file:
+            json.dump(stored, results_file, indent=2)
+            results_file.write("\n")
+        print(f"Saved results for {revision} to {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Stand-in Amplifi router for offline testing and benchmarking.
+
+Implements login.php, info.php and info-async.php with the same token and
+cookie flow as the router and serves synthetic payloads of any size:
+
+    python tools/mock_router.py --clients 500 --access-points 3
+
+Then add the integration with host 127.0.0.1:8080 and password "password".
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import secrets
+import string
+
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+SESSION_COOKIE = "webui-session"
+WAN_PORT = "eth-0"
+
+LOGIN_PAGE = """<html><body><form method="post" action="login.php">
+<input type='hidden' name='token' value='{token}'>
+<input type='password' name='password'></form></body></html>"""
+INFO_PAGE = """<html><head><script>var token='{token}';</script></head></html>"""
+
+
+@dataclass
+class MockRouterConfig:
+    """Shape of the synthetic network and the misbehaviour of the router."""
+
+    password: str = "password"
+    access_points: int = 1
+    bands: tuple = ("2.4 GHz", "5 GHz")
+    clients: int = 10
+    ethernet_ports: int = 5
+    ethernet_devices: int = 1
+    # Seconds added to every response
+    latency: float = 0.0
+    # Invalidate the session every N data requests (0 never)
+    invalidate_every: int = 0
+    # Answer every N-th data request with broken JSON (0 never)
+    malformed_every: int = 0
+    # Fraction of the clients that are offline on a given poll
+    churn: float = 0.0
+    # Answer the light "wan" and "devices" requests instead of ignoring "do"
+    light_requests: bool = False
+    # Answer to a light request without light_requests: "ignore" sends the
+    # full payload, "empty" an empty body, "error" a 500 and "page" the login page
+    unknown_modes: str = "ignore"
+    seed: int = 0
+
+
+def _mac(prefix, index):
+    return f"{prefix}:{(index >> 16) & 0xFF:02x}:{(index >> 8) & 0xFF:02x}:{index & 0xFF:02x}"
+
+
+def access_point_macs(config):
+    """Return the MAC addresses of the mesh points, the router first."""
+    return [_mac("02:aa:00", index) for index in range(config.access_points)]
+
+
+def client_macs(config):
+    """Return the MAC addresses of every wifi client."""
+    return [_mac("02:00:00", index) for index in range(config.clients)]
+
+
+def ethernet_device_macs(config):
+    """Return the MAC addresses of the devices on the ethernet ports."""
+    return [_mac("02:ee:00", index) for index in range(config.ethernet_devices)]
+
+
+def build_payload(config, poll=0):
+    """Return a synthetic info-async.php "full" payload for the given poll."""
+    rng = random.Random(f"{config.seed}-{poll}")
+    access_points = access_point_macs(config)
+    router_mac = access_points[0]
+
+    topology = {
+        router_mac: {
+            "mac": router_mac,
+            "role": "Router",
+            "level": 0,
+            "friendly_name": "Router",
+            "children": {
+                mac: {
+                    "mac": mac,
+                    "role": "Satellite",
+                    "level": 1,
+                    "friendly_name": f"Mesh Point {index}",
+                    "connection_quality": rng.randint(40, 100),
+                }
+                for index, mac in enumerate(access_points[1:], 1)
+            },
+        }
+    }
+
+    wifi_devices = {
+        mac: {band: {"User network": {}} for band in config.bands}
+        for mac in access_points
+    }
+    for index, mac in enumerate(client_macs(config)):
+        if config.churn and rng.random() < config.churn:
+            continue
+        access_point = access_points[index % len(access_points)]
+        band = config.bands[index % len(config.bands)]
+        # Counters grow with every poll like they do on the router
+        traffic = (index + 1) * 1024 * (poll + 1)
+        wifi_devices[access_point][band]["User network"][mac] = {
+            "Address": f"10.{(index >> 16) & 0xFF}.{(index >> 8) & 0xFF}.{index & 0xFF}",
+            "HostName": f"client-{index}",
+            "Description": f"Client {index}" if index % 3 == 0 else "",
+            "SignalQuality": rng.randint(20, 100),
+            "RxBitrate": rng.choice((6500, 72200, 144400, 866700)),
+            "TxBitrate": rng.choice((6500, 72200, 144400, 866700)),
+            "RxBytes": traffic,
+            "TxBytes": traffic // 4,
+            "Mode": "802.11ac",
+        }
+
+    ports = {}
+    for port in range(config.ethernet_ports):
+        ports[f"eth-{port}"] = {"link": port == 0, "speed": 1000 if port == 0 else 0}
+    ports[WAN_PORT].update(
+        {
+            "rx_bitrate": rng.randint(0, 100000),
+            "tx_bitrate": rng.randint(0, 20000),
+            "rx_bytes": 10**6 * (poll + 1),
+            "tx_bytes": 10**5 * (poll + 1),
+        }
+    )
+
+    devices_info = {}
+    device_to_port = {}
+    for index, mac in enumerate(ethernet_device_macs(config)):
+        port = f"eth-{1 + index % max(config.ethernet_ports - 1, 1)}"
+        devices_info[mac] = {
+            "description": f"Wired {index}",
+            "host_name": f"wired-{index}",
+            "ip": f"10.255.{(index >> 8) & 0xFF}.{index & 0xFF}",
+        }
+        device_to_port[mac] = port
+        if port in ports:
+            ports[port]["link"] = True
+
+    return [
+        topology,
+        wifi_devices,
+        devices_info,
+        {router_mac: device_to_port},
+        {router_mac: ports},
+    ]
+
+
+def _token():
+    return "".join(secrets.choice(string.ascii_letters + string.digits) for _ in range(16))
+
+
+@dataclass
+class MockRouter:
+    """aiohttp application emulating the web UI endpoints of the router."""
+
+    config: MockRouterConfig = field(default_factory=MockRouterConfig)
+    sessions: set = field(default_factory=set)
+    requests: dict = field(default_factory=dict)
+    polls: int = 0
+    # Answer every request with 503, like a router that is rebooting
+    unavailable: bool = False
+
+    def __post_init__(self):
+        self.login_token = _token()
+        self.info_token = _token()
+
+    def create_app(self):
+        """Return the aiohttp application."""
+        app = web.Application()
+        app.router.add_get("/login.php", self.handle_login_page)
+        app.router.add_post("/login.php", self.handle_login)
+        app.router.add_get("/info.php", self.handle_info_page)
+        app.router.add_post("/info-async.php", self.handle_info_async)
+        return app
+
+    def invalidate_sessions(self):
+        """Drop every session, like logging in to the web UI does."""
+        self.sessions.clear()
+
+    async def _respond(self, name):
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        if self.unavailable:
+            raise web.HTTPServiceUnavailable()
+
+    def _has_session(self, request):
+        return request.cookies.get(SESSION_COOKIE) in self.sessions
+
+    async def handle_login_page(self, request):
+        await self._respond("login_page")
+        return web.Response(
+            text=LOGIN_PAGE.format(token=self.login_token), content_type="text/html"
+        )
+
+    async def handle_login(self, request):
+        await self._respond("login")
+        form = await request.post()
+        if (
+            form.get("token") != self.login_token
+            or form.get("password") != self.config.password
+        ):
+            return web.Response(
+                text=LOGIN_PAGE.format(token=self.login_token),
+                content_type="text/html",
+            )
+
+        session = secrets.token_hex(16)
+        self.sessions.add(session)
+        response = web.Response(text="<html></html>", content_type="text/html")
+        response.set_cookie(SESSION_COOKIE, session)
+        return response
+
+    async def handle_info_page(self, request):
+        await self._respond("info_page")
+        if not self._has_session(request):
+            raise web.HTTPFound("/login.php")
+        return web.Response(
+            text=INFO_PAGE.format(token=self.info_token), content_type="text/html"
+        )
+
+    async def handle_info_async(self, request):
+        await self._respond("info_async")
+        form = await request.post()
+        if not self._has_session(request) or form.get("token") != self.info_token:
+            raise web.HTTPFound("/login.php")
+
+        self.polls += 1
+        if self.config.invalidate_every and self.polls % self.config.invalidate_every == 0:
+            self.invalidate_sessions()
+            raise web.HTTPFound("/login.php")
+        if self.config.malformed_every and self.polls % self.config.malformed_every == 0:
+            return web.Response(text='[{"truncated": ', content_type="application/json")
+
+        mode = form.get("do")
+        if mode != "full" and not self.config.light_requests:
+            if self.config.unknown_modes == "empty":
+                return web.Response(content_type="application/json")
+            if self.config.unknown_modes == "error":
+                raise web.HTTPInternalServerError()
+            if self.config.unknown_modes == "page":
+                return web.Response(
+                    text=LOGIN_PAGE.format(token=self.login_token),
+                    content_type="text/html",
+                )
+
+        payload = build_payload(self.config, self.polls)
+        if self.config.light_requests and mode == "wan":
+            payload = [{}, {}, {}, {}, payload[4]]
+        elif self.config.light_requests and mode == "devices":
+            payload = [{}, *payload[1:]]
+        return web.Response(text=json.dumps(payload), content_type="application/json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--access-points", type=int, default=1)
+    parser.add_argument("--bands", default="2.4 GHz,5 GHz")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--ethernet-ports", type=int, default=5)
+    parser.add_argument("--ethernet-devices", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--invalidate-every", type=int, default=0)
+    parser.add_argument("--malformed-every", type=int, default=0)
+    parser.add_argument("--churn", type=float, default=0.0)
+    parser.add_argument("--light-requests", action="store_true")
+    parser.add_argument(
+        "--unknown-modes", choices=("ignore", "empty", "error", "page"), default="ignore"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockRouterConfig(
+        password=args.password,
+        access_points=args.access_points,
+        bands=tuple(args.bands.split(",")),
+        clients=args.clients,
+        ethernet_ports=args.ethernet_ports,
+        ethernet_devices=args.ethernet_devices,
+        latency=args.latency,
+        invalidate_every=args.invalidate_every,
+        malformed_every=args.malformed_every,
+        churn=args.churn,
+        light_requests=args.light_requests,
+        unknown_modes=args.unknown_modes,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(MockRouter(config).create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
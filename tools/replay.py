@@ -0,0 +1,246 @@
+"""Replay a recording of router responses through the integration.
+
+Starts a test Home Assistant instance (pytest-homeassistant-custom-component
+has to be installed) and a stand-in router that answers info-async.php with
+the responses of a recording made with the "record responses" option:
+
+    python tools/replay.py amplifi-recording-<entry id>.jsonl.gz --speed 0
+
+Each recorded response is polled in turn with the request it was recorded
+with. The clock of the coordinator follows the recorded times, so presence
+grace periods, rates and data usage behave like they did on the network,
+while --speed only sets how fast the responses are fed: 1 is real time,
+60 a minute per second and 0 as fast as possible. Prints the events fired,
+the devices and the poll statistics; --output also writes them as JSON.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from homeassistant.const import CONF_HOST, CONF_PASSWORD  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import (  # noqa: E402
+    MockConfigEntry,
+)
+
+from custom_components.amplifi import coordinator as coordinator_module  # noqa: E402
+from custom_components.amplifi.const import (  # noqa: E402
+    CONF_ENABLE_NEW_DEVICES,
+    COORDINATOR,
+    DOMAIN,
+    EVENT_DEVICE_JOINED,
+    EVENT_DEVICE_LEFT,
+    EVENT_DEVICE_ROAMED,
+    INFO_MODES,
+    TIER_INVENTORY,
+)
+from custom_components.amplifi.recording import read_recording  # noqa: E402
+from tools.benchmark import TestHomeAssistant  # noqa: E402
+from tools.mock_router import MockRouter, MockRouterConfig  # noqa: E402
+
+EVENTS = (EVENT_DEVICE_JOINED, EVENT_DEVICE_LEFT, EVENT_DEVICE_ROAMED)
+# info-async.php "do" value -> tier it refreshes
+MODE_TIERS = {mode: tier for tier, mode in INFO_MODES.items()}
+
+
+class ReplayClock:
+    """Time of the coordinator, jumping to the time of each response.
+
+    Between two responses the clock runs in real time so the duration of a
+    poll is still measured. The monotonic clock is the wall clock.
+    """
+
+    def __init__(self):
+        self._offset = None
+
+    def advance_to(self, recorded_time):
+        """Move the clock to the wall time a response was recorded at."""
+        if self._offset is not None:
+            # Never go back, the clock is also the monotonic clock
+            recorded_time = max(recorded_time, self.time())
+        self._offset = recorded_time - time.monotonic()
+
+    def time(self):
+        return time.monotonic() + self._offset
+
+    monotonic = time
+
+    def now(self):
+        return datetime.fromtimestamp(self.time(), timezone.utc).astimezone(
+            dt_util.DEFAULT_TIME_ZONE
+        )
+
+
+class ReplayRouter(MockRouter):
+    """Mock router answering info-async.php with the current recorded response."""
+
+    response = None
+    latency = 0.0
+
+    async def handle_info_async(self, request):
+        await self._respond("info_async")
+        form = await request.post()
+        if not self._has_session(request) or form.get("token") != self.info_token:
+            raise web.HTTPFound("/login.php")
+
+        self.polls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "payload" in self.response:
+            text = json.dumps(self.response["payload"])
+        else:
+            text = self.response["body"]
+        return web.Response(text=text, content_type="application/json")
+
+
+async def async_replay(args):
+    """Replay the recording and return the summary."""
+    responses = list(read_recording(args.recording))
+    # Set up needs a full response, the recording may start with light ones
+    while responses and responses[0].get("mode") != INFO_MODES[TIER_INVENTORY]:
+        responses.pop(0)
+    if not responses:
+        raise SystemExit(f"{args.recording} holds no full response")
+
+    router = ReplayRouter(MockRouterConfig())
+    server = TestServer(router.create_app(), host="127.0.0.1")
+    await server.start_server()
+
+    clock = ReplayClock()
+    coordinator_module.time = SimpleNamespace(
+        monotonic=clock.monotonic, perf_counter=time.perf_counter
+    )
+    coordinator_module.dt_util = SimpleNamespace(
+        now=clock.now, parse_datetime=dt_util.parse_datetime
+    )
+
+    events = {event: 0 for event in EVENTS}
+    start = time.perf_counter()
+    try:
+        async with TestHomeAssistant() as hass:
+            for event in EVENTS:
+                hass.bus.async_listen(
+                    event,
+                    lambda event: events.__setitem__(
+                        event.event_type, events[event.event_type] + 1
+                    ),
+                )
+
+            # The first response is polled while the entry is set up
+            router.response = responses[0]
+            clock.advance_to(responses[0]["time"])
+            entry = MockConfigEntry(
+                domain=DOMAIN,
+                data={
+                    CONF_HOST: f"127.0.0.1:{server.port}",
+                    CONF_PASSWORD: router.config.password,
+                    CONF_ENABLE_NEW_DEVICES: True,
+                },
+                options=args.options,
+                # Only the responses of the recording are polled
+                pref_disable_polling=True,
+            )
+            entry.add_to_hass(hass)
+            await hass.config_entries.async_setup(entry.entry_id)
+            await hass.async_block_till_done()
+            coordinator = hass.data[DOMAIN][entry.entry_id][COORDINATOR]
+
+            for previous, response in zip(responses, responses[1:]):
+                if args.speed:
+                    await asyncio.sleep(
+                        max(response["time"] - previous["time"], 0) / args.speed
+                    )
+                    router.latency = response.get("elapsed", 0) / args.speed
+                router.response = response
+                clock.advance_to(response["time"])
+                # Presence timers run on the loop clock, complete those due now
+                deadline = coordinator._presence_deadline
+                if deadline is not None and deadline <= clock.time():
+                    coordinator._async_presence_timeout(None)
+                coordinator._forced_tier = MODE_TIERS.get(
+                    response.get("mode"), TIER_INVENTORY
+                )
+                await coordinator.async_refresh()
+                await hass.async_block_till_done()
+
+            summary = {
+                "responses": len(responses),
+                "recorded_seconds": round(
+                    responses[-1]["time"] - responses[0]["time"], 3
+                ),
+                "replay_seconds": round(time.perf_counter() - start, 3),
+                "events": events,
+                "wifi_devices": len(coordinator.wifi_devices),
+                "ethernet_devices": len(coordinator.ethernet_devices),
+                "poll_stats": {
+                    **coordinator.poll_stats.as_dict(),
+                    "counters": coordinator.poll_counters,
+                },
+            }
+            await hass.async_stop(force=True)
+    finally:
+        coordinator_module.time = time
+        coordinator_module.dt_util = dt_util
+        await server.close()
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="gzip JSON lines recording")
+    parser.add_argument(
+        "--speed", type=float, default=0, help="1 is real time, 0 as fast as possible"
+    )
+    parser.add_argument(
+        "--options", type=json.loads, default={}, help="options of the entry as JSON"
+    )
+    parser.add_argument("--output", help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Every run warns about the custom integration
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+    summary = asyncio.run(async_replay(args))
+
+    print(
+        f"Replayed {summary['responses']} responses covering "
+        f"{summary['recorded_seconds']:.0f} s in {summary['replay_seconds']:.1f} s"
+    )
+    print(
+        "Events: "
+        + ", ".join(f"{event}={count}" for event, count in summary["events"].items())
+    )
+    print(
+        f"Devices: {summary['wifi_devices']} wifi, "
+        f"{summary['ethernet_devices']} ethernet"
+    )
+    for name, metric in summary["poll_stats"]["metrics"].items():
+        if metric["samples"]:
+            print(
+                f"{name:>14}: p50={metric['p50']:.3f} p95={metric['p95']:.3f} "
+                f"max={metric['max']:.3f}"
+            )
+    print(f"Counters: {summary['poll_stats']['counters']}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(summary, output, indent=2)
+            output.write("\n")
+
+
+if __name__ == "__main__":
+    main()